@@ -0,0 +1,10 @@
+"""Social RSS benchmarks.
+
+Run a benchmark as a module from the project root, for example:
+
+    $ python3 -m benchmarks.rss
+    $ python3 -m benchmarks.tw_text
+    $ python3 -m benchmarks.vk_text
+    $ python3 -m benchmarks.json_decoding --recorded offline-debug
+    $ python3 -m benchmarks.feeds --sizes 50 500
+"""
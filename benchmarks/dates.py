@@ -0,0 +1,83 @@
+"""Compares parsing of tweet creation times and formatting of RSS dates with the generic implementations."""
+
+import calendar
+import time
+import timeit
+
+import dateutil.parser
+
+from social_rss import rss
+from social_rss import tw
+
+
+DATES_NUM = 1000
+"""Number of dates parsed and formatted by every run."""
+
+
+def main():
+    """The script's main function."""
+
+    timestamps = [ 1539202764 - date_id * 97 for date_id in range(DATES_NUM) ]
+    created_at = [ time.strftime("%a %b %d %H:%M:%S +0000 %Y", time.gmtime(timestamp)) for timestamp in timestamps ]
+
+    for date, timestamp in zip(created_at, timestamps):
+        if tw._parse_created_at(date) != timestamp or parse_created_at_by_dateutil(date) != timestamp:
+            raise Exception("Invalid creation time parsing result for {!r}.".format(date))
+
+        if rss._date(timestamp) != format_date_generic(timestamp):
+            raise Exception("Invalid date formatting result for {}.".format(timestamp))
+
+    def format_dates():
+        for timestamp in timestamps:
+            rss._date(timestamp)
+
+    def format_dates_uncached():
+        rss._DATES.clear()
+        format_dates()
+
+    benchmarks = (
+        ( "dateutil.parser", lambda: [ parse_created_at_by_dateutil(date) for date in created_at ] ),
+        ( "tw._parse_created_at", lambda: [ tw._parse_created_at(date) for date in created_at ] ),
+        ( "generic RSS date", lambda: [ format_date_generic(timestamp) for timestamp in timestamps ] ),
+        ( "rss._date (uncached)", format_dates_uncached ),
+        ( "rss._date (cached)", format_dates ),
+    )
+
+    print("{:<22} {:>10}".format("benchmark", "us/date"))
+
+    for name, func in benchmarks:
+        print("{:<22} {:>10.2f}".format(name, _measure(func) / DATES_NUM * 1000000))
+
+
+def parse_created_at_by_dateutil(created_at):
+    """Parses tweet creation time by the generic parser."""
+
+    return int(calendar.timegm(dateutil.parser.parse(created_at).utctimetuple()))
+
+
+def format_date_generic(timestamp):
+    """Formats the specified timestamp according to RFC 822 without any precomputations and caching."""
+
+    week_day_name = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+
+    month_name = [
+        "Jan", "Feb", "Mar", "Apr", "May", "Jun",
+        "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+
+    year, month, day, hour, min, sec, wday, yday, isdst = time.gmtime(timestamp)
+
+    return "{wday}, {day:02d} {month} {year:4d} {hour:02d}:{min:02d}:{sec:02d} GMT".format(
+        wday=week_day_name[wday], day=day, month=month_name[month-1],
+        year=year, hour=hour, min=min, sec=sec)
+
+
+def _measure(func):
+    """Returns the best execution time of the specified function."""
+
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+if __name__ == "__main__":
+    main()
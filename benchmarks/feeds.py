@@ -0,0 +1,247 @@
+"""Measures feed processing throughput on recorded or synthetic API responses.
+
+The responses are replayed via offline debug mode, so the whole processing
+pipeline except network I/O is measured: from decoding of the API responses to
+writing RSS to the client.
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+import tracemalloc
+
+from urllib.parse import parse_qsl, urlencode
+
+import tornado.httpclient
+import tornado.httpserver
+import tornado.ioloop
+import tornado.netutil
+import tornado.web
+
+from benchmarks import payloads
+from social_rss import config
+from social_rss import rss
+from social_rss import tw
+from social_rss import vk
+
+FEED_SIZES = (50, 500, 5000)
+"""Default numbers of items in the benchmarked feeds."""
+
+_VK_ACCESS_TOKEN = "benchmark"
+"""VK access token used for synthetic responses."""
+
+_TWITTER_CREDENTIALS = {
+    "consumer_key":        "benchmark",
+    "consumer_secret":     "benchmark",
+    "access_token_key":    "benchmark",
+    "access_token_secret": "benchmark",
+}
+"""Twitter credentials for the request handler."""
+
+_MIN_RUNS = 5
+"""Minimum number of runs of each benchmark."""
+
+
+class _Fixture:
+    """Recorded or synthetic API responses."""
+
+    def __init__(self, path, vk_access_token=None, vk_items=0, twitter_items=0):
+        self.path = path
+        self.vk_access_token = vk_access_token
+        self.vk_items = vk_items
+        self.twitter_items = twitter_items
+
+
+
+def main():
+    """The script's main function."""
+
+    args = parse_args()
+
+    # Replay the responses and process every request from scratch
+    config.OFFLINE_DEBUG_MODE = True
+    config.FEED_CACHE_TTL = 0
+
+    io_loop = tornado.ioloop.IOLoop.current()
+
+    with tempfile.TemporaryDirectory() as temp_path:
+        if args.recorded is None:
+            fixtures = [ _write_fixture(os.path.join(temp_path, str(size)), size) for size in args.sizes ]
+        else:
+            fixtures = [ _load_fixture(args.recorded) ]
+
+        print("{:<28} {:>7} {:>11} {:>9} {:>9} {:>9} {:>9}".format(
+            "benchmark", "items", "items/sec", "p50, ms", "p90, ms", "p99, ms", "peak, MB"))
+
+        for fixture in fixtures:
+            config.OFFLINE_DEBUG_PATH = fixture.path
+
+            for name, items, run, setup in _get_benchmarks(io_loop, fixture):
+                result = _measure(run, setup, args.min_time)
+                print("{:<28} {:>7} {:>11.0f} {:>9.2f} {:>9.2f} {:>9.2f} {:>9.2f}".format(
+                    name, items, items / result["mean"],
+                    result["p50"] * 1000, result["p90"] * 1000, result["p99"] * 1000,
+                    result["peak_memory"] / 1024 / 1024))
+
+
+def parse_args():
+    """Parses command-line arguments."""
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+
+    parser.add_argument("--sizes", type=int, nargs="+", default=FEED_SIZES, metavar="ITEMS",
+        help="numbers of items in synthetic responses")
+
+    parser.add_argument("--recorded", metavar="PATH",
+        help="use responses recorded by social-rss --write-offline-debug to the specified directory")
+
+    parser.add_argument("--min-time", type=float, default=1, metavar="SECONDS",
+        help="minimum time of each benchmark")
+
+    return parser.parse_args()
+
+
+def _get_benchmarks(io_loop, fixture):
+    """Returns (name, items, run, setup) tuples for the specified fixture."""
+
+    benchmarks = []
+
+    if fixture.vk_items:
+        get_newsfeed = lambda: io_loop.run_sync(
+            lambda: vk._get_newsfeed(fixture.vk_access_token, True))
+        newsfeed = get_newsfeed()
+
+        benchmarks.extend([
+            ( "vk._get_newsfeed", fixture.vk_items, get_newsfeed, vk._RENDERED_ITEMS.clear ),
+            ( "vk._get_newsfeed (memoized)", fixture.vk_items, get_newsfeed, None ),
+            ( "rss.generate (vk)", len(newsfeed.items), lambda: rss.generate(newsfeed), None ),
+        ])
+
+    if fixture.twitter_items:
+        with open(os.path.join(fixture.path, "twitter"), "rb") as timeline_file:
+            timeline = json.loads(timeline_file.read().decode())
+
+        feed = tw._get_feed(timeline)
+
+        benchmarks.extend([
+            ( "tw._get_feed", fixture.twitter_items, lambda: tw._get_feed(timeline), tw._RENDERED_ITEMS.clear ),
+            ( "tw._get_feed (memoized)", fixture.twitter_items, lambda: tw._get_feed(timeline), None ),
+            ( "rss.generate (twitter)", len(feed.items), lambda: rss.generate(feed), None ),
+        ])
+
+    if fixture.vk_items or fixture.twitter_items:
+        url = _start_server(fixture)
+        client = tornado.httpclient.AsyncHTTPClient()
+
+        def fetch(path):
+            return lambda: io_loop.run_sync(lambda: client.fetch(url + path))
+
+        if fixture.vk_items:
+            benchmarks.append(( "GET /vk.rss", fixture.vk_items, fetch("/vk.rss"), vk._RENDERED_ITEMS.clear ))
+
+        if fixture.twitter_items:
+            benchmarks.append((
+                "GET /twitter.rss", fixture.twitter_items, fetch("/twitter.rss"), tw._RENDERED_ITEMS.clear ))
+
+    return benchmarks
+
+
+def _start_server(fixture):
+    """Starts an in-process server for the specified fixture and returns its URL."""
+
+    application = tornado.web.Application([
+        ("/twitter.rss", tw.RequestHandler, {"credentials": _TWITTER_CREDENTIALS}),
+        ("/vk.rss", vk.RequestHandler, {"access_token": fixture.vk_access_token}),
+    ])
+
+    sockets = tornado.netutil.bind_sockets(0, "127.0.0.1")
+
+    server = tornado.httpserver.HTTPServer(application)
+    server.add_sockets(sockets)
+
+    return "http://127.0.0.1:{}".format(sockets[0].getsockname()[1])
+
+
+def _measure(run, setup, min_time):
+    """Measures the specified function.
+
+    setup is called before every run and isn't measured.
+    """
+
+    durations = []
+
+    while len(durations) < _MIN_RUNS or sum(durations) < min_time:
+        if setup is not None:
+            setup()
+
+        start_time = time.perf_counter()
+        run()
+        durations.append(time.perf_counter() - start_time)
+
+    if setup is not None:
+        setup()
+
+    tracemalloc.start()
+    try:
+        run()
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    durations.sort()
+
+    return {
+        "mean":        sum(durations) / len(durations),
+        "p50":         _percentile(durations, 50),
+        "p90":         _percentile(durations, 90),
+        "p99":         _percentile(durations, 99),
+        "peak_memory": peak_memory,
+    }
+
+
+def _percentile(values, percentile):
+    """Returns the specified percentile of the sorted values."""
+
+    return values[min(len(values) - 1, len(values) * percentile // 100)]
+
+
+def _write_fixture(path, size):
+    """Writes synthetic responses with the specified number of items as offline debug data."""
+
+    os.mkdir(path)
+
+    kwargs = { "max_photos": 10, "access_token": _VK_ACCESS_TOKEN, "language": "0", "v": "5.0" }
+    with open(os.path.join(path, "vk:newsfeed.get:" + urlencode(sorted(kwargs.items()))), "w") as newsfeed_file:
+        json.dump(payloads.vk_newsfeed(size), newsfeed_file)
+
+    with open(os.path.join(path, "twitter"), "w") as timeline_file:
+        json.dump(payloads.home_timeline(size), timeline_file)
+
+    return _Fixture(path, _VK_ACCESS_TOKEN, size, size)
+
+
+def _load_fixture(path):
+    """Loads offline debug data recorded to the specified directory."""
+
+    fixture = _Fixture(path)
+
+    for file_name in os.listdir(path):
+        if file_name.startswith("vk:newsfeed.get:"):
+            fixture.vk_access_token = dict(parse_qsl(file_name.split(":", 2)[2]))["access_token"]
+
+            with open(os.path.join(path, file_name), "rb") as newsfeed_file:
+                fixture.vk_items = len(json.loads(newsfeed_file.read().decode())["response"]["items"])
+        elif file_name == "twitter":
+            with open(os.path.join(path, file_name), "rb") as timeline_file:
+                fixture.twitter_items = len(json.loads(timeline_file.read().decode()))
+
+    if not fixture.vk_items and not fixture.twitter_items:
+        raise Exception("There are no recorded responses in {}.".format(path))
+
+    return fixture
+
+
+if __name__ == "__main__":
+    main()
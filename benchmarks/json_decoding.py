@@ -0,0 +1,111 @@
+"""Compares decoding of API responses via a string and by the JSON decoder.
+
+The responses are read as they are stored by offline debug mode: recorded by
+social-rss --write-offline-debug or synthetic ones.
+"""
+
+import argparse
+import json
+import os
+import timeit
+import tracemalloc
+
+from benchmarks import payloads
+from social_rss import json_decoder
+
+FEED_SIZES = (50, 500, 5000)
+"""Default numbers of items in the synthetic responses."""
+
+
+def main():
+    """The script's main function."""
+
+    args = parse_args()
+
+    if args.recorded is None:
+        responses = []
+
+        for size in args.sizes:
+            responses.extend([
+                ( "vk:newsfeed.get ({})".format(size), json.dumps(payloads.vk_newsfeed(size)).encode() ),
+                ( "twitter ({})".format(size), json.dumps(payloads.home_timeline(size)).encode() ),
+            ])
+    else:
+        responses = _load_responses(args.recorded)
+
+    benchmarks = (
+        ( "json.loads(str)", lambda body: json.loads(body.decode("utf-8")) ),
+        ( "json.loads(bytes)", json.loads ),
+        ( "json_decoder.loads", json_decoder.loads ),
+    )
+
+    print("JSON decoder backend: {}.".format("orjson" if json_decoder.orjson is not None else "json"))
+    print("{:<28} {:<20} {:>9} {:>9} {:>9}".format("response", "benchmark", "size, KB", "MB/sec", "peak, MB"))
+
+    for name, body in responses:
+        expected = json.loads(body.decode("utf-8"))
+
+        for benchmark_name, loads in benchmarks:
+            if loads(body) != expected:
+                raise Exception("Invalid {} result for {} response.".format(benchmark_name, name))
+
+            duration = _measure(lambda: loads(body))
+            peak_memory = _peak_memory(lambda: loads(body))
+
+            print("{:<28} {:<20} {:>9.0f} {:>9.1f} {:>9.2f}".format(
+                name, benchmark_name, len(body) / 1024, len(body) / duration / 1024 / 1024,
+                peak_memory / 1024 / 1024))
+
+
+def parse_args():
+    """Parses command-line arguments."""
+
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+
+    parser.add_argument("--sizes", type=int, nargs="+", default=FEED_SIZES, metavar="ITEMS",
+        help="numbers of items in synthetic responses")
+
+    parser.add_argument("--recorded", metavar="PATH",
+        help="use responses recorded by social-rss --write-offline-debug to the specified directory")
+
+    return parser.parse_args()
+
+
+def _load_responses(path):
+    """Loads API responses recorded to the specified directory."""
+
+    responses = []
+
+    for file_name in sorted(os.listdir(path)):
+        if file_name == "twitter" or file_name.startswith("vk:"):
+            with open(os.path.join(path, file_name), "rb") as response_file:
+                # Don't print request parameters which contain the access token
+                responses.append(( ":".join(file_name.split(":")[:2]), response_file.read() ))
+
+    if not responses:
+        raise Exception("There are no recorded responses in {}.".format(path))
+
+    return responses
+
+
+def _measure(func):
+    """Returns the best execution time of the specified function."""
+
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+def _peak_memory(func):
+    """Returns peak memory allocated by the specified function."""
+
+    tracemalloc.start()
+    try:
+        func()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+if __name__ == "__main__":
+    main()
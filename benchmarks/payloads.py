@@ -0,0 +1,134 @@
+"""Synthetic API responses."""
+
+import random
+
+_USERS_NUM = 30
+"""Number of profiles and groups referenced by the responses."""
+
+
+def vk_newsfeed(size, seed=0):
+    """Returns a synthetic newsfeed.get response with the specified number of items."""
+
+    rand = random.Random(seed)
+
+    profiles = [{
+        "id":         user_id,
+        "first_name": "Имя{}".format(user_id),
+        "last_name":  "Фамилия",
+        "photo":      "https://vk.com/images/profile{}.jpg".format(user_id),
+    } for user_id in range(1, _USERS_NUM)]
+
+    groups = [{
+        "id":       group_id,
+        "name":     "Группа {}".format(group_id),
+        "photo_50": "https://vk.com/images/group{}.jpg".format(group_id),
+    } for group_id in range(1, _USERS_NUM)]
+
+    items = []
+
+    for item_id in range(size):
+        source_id = rand.choice((1, -1)) * rand.randint(1, _USERS_NUM - 1)
+        item_type = rand.choice(("post", "post", "post", "photo", "friend", "note", "audio"))
+
+        item = {
+            "type":      item_type,
+            "source_id": source_id,
+            "date":      1400000000 - item_id * 60,
+        }
+
+        if item_type == "post":
+            item["post_id"] = item_id
+            item["text"] = (
+                "Текст со ссылками http://example.com/post{} и example.org/path, "
+                "упоминанием [id5|Пети]<br>и второй строкой".format(item_id))
+
+            item["attachments"] = [{
+                "type": "photo",
+                "photo": {
+                    "owner_id": source_id, "id": item_id,
+                    "photo_604": "https://vk.com/images/photo604.jpg",
+                    "photo_130": "https://vk.com/images/photo130.jpg",
+                },
+            }, {
+                "type": "link",
+                "link": {
+                    "url": "http://example.com/", "title": "Заголовок",
+                    "description": "Описание со ссылкой http://example.com/description",
+                },
+            }, {
+                "type": "video",
+                "video": {
+                    "id": item_id, "title": "Видео", "duration": 3671,
+                    "photo_320": "https://vk.com/images/video320.jpg",
+                },
+            }, {
+                "type": "audio",
+                "audio": { "artist": "Исполнитель", "title": "Песня", "duration": 200 },
+            }][:rand.randint(0, 4)]
+
+            if rand.random() < 0.3:
+                item["copy_owner_id"] = rand.randint(1, _USERS_NUM - 1)
+                item["copy_post_id"] = 1
+                item["copy_text"] = "Текст исходной записи"
+        elif item_type == "photo":
+            item["photos"] = {
+                "count": 3,
+                "items": [{
+                    "owner_id": source_id, "id": photo_id,
+                    "photo_604": "https://vk.com/images/photo{}.jpg".format(photo_id),
+                } for photo_id in range(2)],
+            }
+        elif item_type == "friend":
+            item["friends"] = { "count": 2, "items": [{ "uid": 3 }, { "uid": 4 }] }
+        elif item_type == "note":
+            item["notes"] = {
+                "count": 1,
+                "items": [{ "owner_id": source_id, "id": 1, "title": "Заметка" }],
+            }
+
+        items.append(item)
+
+    return {
+        "response": {
+            "items":     items,
+            "profiles":  profiles,
+            "groups":    groups,
+            "next_from": "next",
+        }
+    }
+
+
+def home_timeline(size, seed=0):
+    """Returns a synthetic statuses/home_timeline response with the specified number of tweets."""
+
+    rand = random.Random(seed)
+    tweets = []
+
+    for tweet_id in range(size):
+        user = {
+            "name":                    "User {}".format(tweet_id % _USERS_NUM),
+            "screen_name":             "user{}".format(tweet_id % _USERS_NUM),
+            "profile_image_url_https": "https://pbs.twimg.com/profile{}.png".format(tweet_id % _USERS_NUM),
+        }
+
+        tweet = {
+            "id_str":     str(1000000 + tweet_id),
+            "created_at": "Wed Oct 10 20:{:02d}:{:02d} +0000 2018".format(59 - tweet_id // 60 % 60, 59 - tweet_id % 60),
+            "user":       user,
+            "full_text":  "Hello @bob, check https://t.co/abcdefgh #tag &amp; more",
+            "entities":   {
+                "urls": [{
+                    "indices": [18, 39], "expanded_url": "https://example.com/",
+                    "display_url": "example.com",
+                }],
+                "user_mentions": [{ "indices": [6, 10], "screen_name": "bob", "name": "Bob" }],
+                "hashtags": [{ "indices": [40, 44], "text": "tag" }],
+            },
+        }
+
+        if rand.random() < 0.3:
+            tweet["retweeted_status"] = dict(tweet, user=dict(user, name="Original user"))
+
+        tweets.append(tweet)
+
+    return tweets
@@ -0,0 +1,69 @@
+"""Compares RSS generation by the template and by the compact serializer."""
+
+import timeit
+
+from social_rss import rss
+from social_rss.feed import Feed, FeedItem
+
+
+FEED_SIZES = (50, 500, 5000)
+"""Numbers of items in the benchmarked feeds."""
+
+
+def main():
+    """The script's main function."""
+
+    print("{:>6}  {:>12}  {:>12}  {:>7}".format("items", "template", "serializer", "speedup"))
+
+    for size in FEED_SIZES:
+        feed = get_feed(size)
+
+        if rss.generate(feed, use_template=True) != rss.generate(feed):
+            raise Exception("The serializer's output differs from the template's one.")
+
+        template_time = _measure(lambda: rss.generate(feed, use_template=True))
+        serializer_time = _measure(lambda: rss.generate(feed))
+
+        print("{:>6}  {:>10.2f}ms  {:>10.2f}ms  {:>6.1f}x".format(
+            size, template_time * 1000, serializer_time * 1000, template_time / serializer_time))
+
+
+def get_feed(size):
+    """Returns a synthetic feed with the specified number of items."""
+
+    items = []
+
+    for item_id in range(size):
+        items.append(FeedItem(
+            id="id{0}/post/{1}".format(item_id % 100, 1400000000 + item_id),
+            time=1400000000 + item_id,
+            title="Пользователь {}: запись на стене".format(item_id % 100),
+            author="Пользователь {}".format(item_id % 100),
+            url="https://vk.com/wall{}_{}".format(item_id % 100, item_id),
+            text=(
+                "<table cellpadding='0' cellspacing='0'><tr valign='top'><td>"
+                "<a href='https://vk.com/id1'><img style='display: block; border-style: none;' "
+                "src='https://example.com/photo.jpg' /></a></td><td width='10'></td><td>"
+                "<p>Текст записи со ссылкой <a href='http://example.com/'>http://example.com/</a> "
+                "&amp; упоминанием <b><a href='https://vk.com/id1'>пользователя</a></b>.</p>"
+                "</td></tr></table>" * (1 + item_id % 3)),
+            categories=["source/user/id{}".format(item_id % 100), "type/post", "type/posted_photo"]))
+
+    return Feed(
+        title="Benchmark",
+        url="https://example.com/",
+        image="https://example.com/image.png",
+        description="Benchmark feed",
+        items=items)
+
+
+def _measure(func):
+    """Returns the best execution time of the specified function."""
+
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+if __name__ == "__main__":
+    main()
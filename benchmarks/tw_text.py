@@ -0,0 +1,192 @@
+"""Compares tweet text rendering by prepending and by the forward-pass renderer.
+
+The renderer is checked against the prepending implementation on a corpus of
+tweets with all kinds of entities before the measurements.
+"""
+
+import logging
+import timeit
+
+from urllib.parse import urlencode
+
+from social_rss import tw
+from social_rss.render import block as _block
+from social_rss.render import image as _image
+from social_rss.render import link as _link
+
+
+ENTITY_COUNTS = (1, 10, 100, 1000)
+"""Numbers of entities in the benchmarked tweets."""
+
+CORPUS = [
+    ( "text only", "Just a text &amp; nothing else", {} ),
+
+    ( "no entities", "Text with empty entity lists", {
+        "hashtags": [], "symbols": [], "user_mentions": [], "urls": [] } ),
+
+    ( "url", "Look at https://t.co/abcdefgh!", {
+        "urls": [{ "indices": [8, 29], "expanded_url": "https://example.com/page", "display_url": "example.com/page" }] } ),
+
+    ( "mention", "@bob hi", {
+        "user_mentions": [{ "indices": [0, 4], "screen_name": "bob", "name": "Bob" }] } ),
+
+    ( "hashtag", "Happy #Кириллица day", {
+        "hashtags": [{ "indices": [6, 16], "text": "Кириллица" }] } ),
+
+    ( "media", "Photos https://t.co/photo1 https://t.co/photo2", {
+        "media": [
+            { "indices": [7, 26], "expanded_url": "https://twitter.com/a/status/1/photo/1",
+              "display_url": "pic.twitter.com/photo1", "media_url_https": "https://pbs.twimg.com/media/1.jpg" },
+            { "indices": [27, 46], "expanded_url": "https://twitter.com/a/status/1/photo/2",
+              "display_url": "pic.twitter.com/photo2", "media_url_https": "https://pbs.twimg.com/media/2.jpg" },
+        ] } ),
+
+    ( "all types", "@bob #tag https://t.co/url https://t.co/pic end", {
+        "hashtags": [{ "indices": [5, 9], "text": "tag" }],
+        "user_mentions": [{ "indices": [0, 4], "screen_name": "bob", "name": "Bob" }],
+        "urls": [{ "indices": [10, 26], "expanded_url": "https://example.com/", "display_url": "example.com" }],
+        "media": [{ "indices": [27, 42], "expanded_url": "https://twitter.com/a/status/1/photo/1",
+                    "display_url": "pic.twitter.com/pic", "media_url_https": "https://pbs.twimg.com/media/pic.jpg" }],
+    } ),
+
+    ( "unsorted", "#b #a @c", {
+        "hashtags": [{ "indices": [3, 5], "text": "a" }, { "indices": [0, 2], "text": "b" }],
+        "user_mentions": [{ "indices": [6, 8], "screen_name": "c", "name": "C" }],
+    } ),
+
+    ( "overlapping", "@bob@alice https://t.co/x", {
+        "user_mentions": [
+            { "indices": [0, 10], "screen_name": "bob", "name": "Bob" },
+            { "indices": [4, 10], "screen_name": "alice", "name": "Alice" },
+        ],
+        "urls": [{ "indices": [8, 25], "expanded_url": "https://example.com/", "display_url": "example.com" }],
+    } ),
+
+    ( "same position", "#tag text", {
+        "hashtags": [{ "indices": [0, 4], "text": "tag" }, { "indices": [0, 3], "text": "ta" }],
+        "user_mentions": [{ "indices": [0, 4], "screen_name": "tag", "name": "Tag" }],
+    } ),
+
+    ( "out of text", "Short", {
+        "urls": [{ "indices": [3, 30], "expanded_url": "https://example.com/", "display_url": "example.com" }],
+        "hashtags": [{ "indices": [40, 45], "text": "none" }],
+    } ),
+
+    ( "unknown", "Price of $TWTR is @bob", {
+        "symbols": [{ "indices": [9, 14], "text": "TWTR" }],
+        "user_mentions": [{ "indices": [18, 22], "screen_name": "bob", "name": "Bob" }],
+    } ),
+]
+"""(name, text, entities) tuples of tweets which must be rendered identically."""
+
+
+def main():
+    """The script's main function."""
+
+    # Suppress errors about unknown entities
+    logging.disable(logging.ERROR)
+
+    for name, text, entities in CORPUS:
+        if tw._parse_text(text, entities) != parse_text_by_prepending(text, entities):
+            raise Exception("The renderer's output differs from the prepending one for {!r} tweet.".format(name))
+
+    print("{:>8}  {:>12}  {:>12}  {:>7}".format("entities", "prepending", "renderer", "speedup"))
+
+    for count in ENTITY_COUNTS:
+        text, entities = get_tweet(count)
+
+        if tw._parse_text(text, entities) != parse_text_by_prepending(text, entities):
+            raise Exception("The renderer's output differs from the prepending one.")
+
+        prepending_time = _measure(lambda: parse_text_by_prepending(text, entities))
+        renderer_time = _measure(lambda: tw._parse_text(text, entities))
+
+        print("{:>8}  {:>10.3f}ms  {:>10.3f}ms  {:>6.1f}x".format(
+            count, prepending_time * 1000, renderer_time * 1000, prepending_time / renderer_time))
+
+
+def get_tweet(count):
+    """Returns a synthetic (text, entities) tweet with the specified number of entities."""
+
+    fragments = []
+    entities = { "hashtags": [], "user_mentions": [], "urls": [] }
+    pos = 0
+
+    for entity_id in range(count):
+        fragment = "text {} ".format(entity_id)
+        fragments.append(fragment)
+        pos += len(fragment)
+
+        entity_type = ("hashtags", "user_mentions", "urls")[entity_id % 3]
+
+        if entity_type == "hashtags":
+            fragment = "#tag{}".format(entity_id)
+            entity = { "text": fragment[1:] }
+        elif entity_type == "user_mentions":
+            fragment = "@user{}".format(entity_id)
+            entity = { "screen_name": fragment[1:], "name": "User {}".format(entity_id) }
+        else:
+            fragment = "https://t.co/{:08d}".format(entity_id)
+            entity = { "expanded_url": "https://example.com/{}".format(entity_id), "display_url": "example.com" }
+
+        entity["indices"] = [ pos, pos + len(fragment) ]
+        entities[entity_type].append(entity)
+
+        fragments.append(fragment)
+        pos += len(fragment)
+
+    return "".join(fragments), entities
+
+
+def parse_text_by_prepending(text, tweet_entities):
+    """Renders a tweet text by prepending entities as it was done before the forward-pass renderer."""
+
+    sorted_entities = []
+
+    for entity_type, entities in tweet_entities.items():
+        for entity in entities:
+            sorted_entities.append(( entity_type, entity ))
+
+    sorted_entities.sort(
+        key=lambda entity_tuple: entity_tuple[1]["indices"][0], reverse=True)
+
+    html = ""
+    media_html = ""
+    pos = len(text)
+
+    for entity_type, entity in sorted_entities:
+        start, end = entity["indices"]
+
+        if end < pos:
+            html = text[end:pos] + html
+
+        if entity_type == "urls":
+            html = _link(entity["expanded_url"], entity["display_url"]) + html
+        elif entity_type == "user_mentions":
+            html = _link(tw._twitter_user_url(entity["screen_name"]), entity["name"]) + html
+        elif entity_type == "hashtags":
+            html = _link(tw._TWITTER_URL + "search?" + urlencode({ "q": "#" + entity["text"] }), text[start:end]) + html
+        elif entity_type == "media":
+            html = _link(entity["expanded_url"], entity["display_url"]) + html
+            media_html += _block(_link(entity["expanded_url"], _image(entity["media_url_https"])))
+        else:
+            html = text[start:end] + html
+
+        pos = start
+
+    if pos:
+        html = text[:pos] + html
+
+    return _block(html) + media_html
+
+
+def _measure(func):
+    """Returns the best execution time of the specified function."""
+
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+if __name__ == "__main__":
+    main()
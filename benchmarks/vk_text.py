@@ -0,0 +1,75 @@
+"""Compares VK post text parsing by regular expressions and by the single-pass parser."""
+
+import re
+import timeit
+
+from social_rss import vk
+from social_rss.render import em as _em
+from social_rss.render import link as _link
+
+
+TEXT_SIZES = (1, 10, 100, 1000)
+"""Numbers of repetitions of the text patterns in the benchmarked texts."""
+
+TEXTS = {
+    "plain":     "Обычный текст без ссылок, но с разными словами и знаками препинания. ",
+    "links":     "Текст со ссылками http://example.com/post и example.org/path, упоминанием [id5|Пети]<br>",
+    "urls":      ">http://example.com/path?query",
+    "domains":   " example.com/path>example.org/",
+    "mentions":  "[id1|",
+}
+"""Text patterns. Texts of all patterns except the first two end with a quote,
+so URLs and user links which never end are searched through the whole text."""
+
+_TEXT_URL_RE = re.compile(r"(^|\s|>)(https?://[^']+?)(\.?(?:<|\s|$))")
+_DOMAIN_ONLY_TEXT_URL_RE = re.compile(r"(^|\s|>)((?:[a-z0-9](?:[-a-z0-9]*[a-z0-9])?\.)+[a-z0-9](?:[-a-z0-9]*[a-z0-9])/[^']+?)(\.?(?:<|\s|$))")
+_USER_LINK_RE = re.compile(r"\[((?:id|club)\d+)\|([^\]]+)\]")
+
+
+def main():
+    """The script's main function."""
+
+    print("{:<10} {:>6}  {:>12}  {:>12}  {:>7}".format("text", "size", "regexes", "parser", "speedup"))
+
+    for name, pattern in TEXTS.items():
+        for size in TEXT_SIZES:
+            text = pattern * size
+            if name not in ("plain", "links"):
+                text += "'"
+
+            if vk._parse_text(text) != parse_text_by_regexes(text):
+                raise Exception("The parser's output differs from the regular expressions' one.")
+
+            # Pathological texts take quadratic time with regular expressions
+            if size > 100 and name not in ("plain", "links"):
+                regexes_time = None
+            else:
+                regexes_time = _measure(lambda: parse_text_by_regexes(text))
+
+            parser_time = _measure(lambda: vk._parse_text(text))
+
+            print("{:<10} {:>6}  {:>12}  {:>10.3f}ms  {:>7}".format(
+                name, size, "-" if regexes_time is None else "{:.3f}ms".format(regexes_time * 1000),
+                parser_time * 1000, "-" if regexes_time is None else "{:.1f}x".format(regexes_time / parser_time)))
+
+
+def parse_text_by_regexes(html):
+    """Parses a post text by regular expressions as it was done before the single-pass parser."""
+
+    html = _TEXT_URL_RE.sub(r"\1" + _link(r"\2", r"\2") + r"\3", html)
+    html = _DOMAIN_ONLY_TEXT_URL_RE.sub(r"\1" + _link(r"http://\2", r"\2") + r"\3", html)
+    html = _USER_LINK_RE.sub(_em(_link(r"https://vk.com/\1", r"\2")), html)
+
+    return html.strip()
+
+
+def _measure(func):
+    """Returns the best execution time of the specified function."""
+
+    timer = timeit.Timer(func)
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=3, number=number)) / number
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,611 @@
+"""Caching tools."""
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import time
+
+import tornado.concurrent
+import tornado.gen
+import tornado.ioloop
+
+import social_rss.rss
+from social_rss import compression
+from social_rss import config
+from social_rss import metrics
+from social_rss import rate_limit
+from social_rss import store
+
+LOG = logging.getLogger(__name__)
+
+
+class CachedFeed:
+    """A cached feed.
+
+    The RSS is generated lazily on first use, so feeds which are only
+    validated by clients via conditional requests are never rendered. Until
+    then the feed's size is estimated by the size of its content.
+
+    The whole RSS is kept only when it's needed (for compression or for the
+    shared cache). Otherwise it's streamed to the clients while it's being
+    generated.
+    """
+
+    def __init__(self, key, feed):
+        self.key = key
+        self.time = time.time()
+
+        self.etag, self.last_modified, self.__content_size = _get_validators(feed)
+
+        self.__feed = feed
+        self.__rss = None
+        self.__compressed_rss = {}
+
+    @classmethod
+    def load(cls, key, time, etag, last_modified, rss):
+        """Creates a cached feed from already generated RSS."""
+
+        feed = cls.__new__(cls)
+
+        feed.key = key
+        feed.time = time
+        feed.etag = etag
+        feed.last_modified = last_modified
+
+        feed.__content_size = 0
+        feed.__feed = None
+        feed.__rss = rss
+        feed.__compressed_rss = {}
+
+        return feed
+
+    @property
+    def rendered(self):
+        """Whether the RSS has already been generated."""
+
+        return self.__rss is not None
+
+    @property
+    def size(self):
+        """Size of the generated and compressed RSS."""
+
+        size = self.__content_size if self.__rss is None else len(self.__rss)
+        return size + sum(len(rss) for rss in self.__compressed_rss.values())
+
+    def rss(self):
+        """Returns the generated RSS.
+
+        The result is saved, so the RSS is generated only once.
+        """
+
+        if self.__rss is None:
+            self.__rss = social_rss.rss.generate(self.__feed)
+            self.__feed = None
+
+        return self.__rss
+
+    def iter_rss(self):
+        """Generates the RSS chunk by chunk.
+
+        If the RSS hasn't been saved yet, it's generated on the fly and isn't
+        saved, so the whole RSS isn't held in memory while it's being sent.
+        """
+
+        if self.__rss is None:
+            yield from social_rss.rss.iter_rss(self.__feed)
+        else:
+            yield self.__rss
+
+    def compressed_rss(self, encoding):
+        """Returns the RSS compressed with the specified content encoding.
+
+        The result is saved, so the RSS is compressed only once.
+        """
+
+        try:
+            return self.__compressed_rss[encoding]
+        except KeyError:
+            rss = self.__compressed_rss[encoding] = compression.compress(self.rss(), encoding)
+            return rss
+
+    def reuse(self, other):
+        """Reuses the RSS generated for other feed if it has the same content.
+
+        The ETag is derived from the whole content of the feed, so feeds with
+        equal ETags are rendered to the same RSS.
+        """
+
+        if other.rendered and other.etag == self.etag:
+            self.__rss = other.rss()
+            self.__compressed_rss = dict(other.__compressed_rss)
+            self.__feed = None
+
+
+class FeedCache:
+    """In-process LRU cache of generated feeds.
+
+    Feeds are served from the cache during config.FEED_CACHE_TTL. After that,
+    during config.FEED_CACHE_STALE_TTL the stale feed is still served, but it's
+    refreshed in background. Outdated feeds are also served when they can't be
+    refreshed due to API rate limiting.
+
+    If config.SHARED_CACHE_PATH is set, feeds are also shared with other
+    processes via DiskCache. If config.STORE_PATH is set, feeds are saved to
+    the persistent store and after restart are served from it while they're
+    being refreshed.
+    """
+
+    def __init__(self):
+        self.__feeds = collections.OrderedDict()
+        self.__size = 0
+        self.__in_flight = {}
+        self.__shared = DiskCache()
+
+
+    def __len__(self):
+        return len(self.__feeds)
+
+
+    @property
+    def size(self):
+        """Total size of the cached feeds."""
+
+        return self.__size
+
+
+    @tornado.gen.coroutine
+    def get(self, key, get_feed):
+        """Returns a CachedFeed for the specified key.
+
+        get_feed is a callable which returns a future resolving to the feed.
+        It's called on cache miss or when the cached feed has to be refreshed.
+        """
+
+        feed = self.__feeds.get(key) if config.FEED_CACHE_TTL > 0 else None
+
+        if (
+            config.SHARED_CACHE_PATH is not None and config.FEED_CACHE_TTL > 0 and
+            (feed is None or time.time() - feed.time >= config.FEED_CACHE_TTL)
+        ):
+            shared_feed = self.__shared.load(key)
+
+            # The feed may have been refreshed by another process
+            if shared_feed is not None and (feed is None or shared_feed.time > feed.time):
+                self.__store(shared_feed)
+                feed = shared_feed
+
+        if feed is None and config.STORE_PATH is not None and config.FEED_CACHE_TTL > 0:
+            feed = yield self.__restore(key)
+
+            # Serve the stored feed immediately regardless of its age
+            if feed is not None:
+                metrics.FEED_CACHE_REQUESTS.inc("stored")
+
+                if time.time() - feed.time >= config.FEED_CACHE_TTL:
+                    tornado.ioloop.IOLoop.current().add_future(
+                        self.__update(key, get_feed), self.__on_refreshed)
+
+                return feed
+
+        if feed is not None:
+            age = time.time() - feed.time
+
+            if age < config.FEED_CACHE_TTL + config.FEED_CACHE_STALE_TTL:
+                self.__feeds.move_to_end(key)
+
+                if age < config.FEED_CACHE_TTL:
+                    metrics.FEED_CACHE_REQUESTS.inc("hit")
+                else:
+                    metrics.FEED_CACHE_REQUESTS.inc("stale")
+
+                    if key not in self.__in_flight:
+                        tornado.ioloop.IOLoop.current().add_future(
+                            self.__update(key, get_feed), self.__on_refreshed)
+
+                return feed
+
+        metrics.FEED_CACHE_REQUESTS.inc("miss")
+
+        try:
+            feed = yield self.__update(key, get_feed)
+        except rate_limit.RateLimitExceeded as e:
+            # Even an outdated feed is better than an error
+            if feed is None:
+                raise
+
+            metrics.FEED_CACHE_REQUESTS.inc("outdated")
+            LOG.warning("Serving an outdated feed: %s", e)
+
+        return feed
+
+
+    def refresh(self, key, get_feed):
+        """Refreshes the feed with the specified key.
+
+        Returns a future which resolves to the refreshed CachedFeed or to None
+        if the feed has been refreshed by another process during the last half
+        of config.PREFETCH_INTERVAL.
+        """
+
+        if config.SHARED_CACHE_PATH is not None:
+            feed_time = self.__shared.time(key)
+
+            if feed_time is not None and time.time() - feed_time < config.PREFETCH_INTERVAL / 2:
+                future = tornado.concurrent.Future()
+                future.set_result(None)
+                return future
+
+        return self.__update(key, get_feed)
+
+
+    def compressed_rss(self, feed, encoding):
+        """Returns the RSS for the specified feed compressed with the specified content encoding."""
+
+        size = feed.size
+        rss = feed.compressed_rss(encoding)
+        self.__resized(feed, size)
+
+        return rss
+
+
+    def __update(self, key, get_feed):
+        """Fetches a feed and stores it in the cache.
+
+        Concurrent updates of the same feed share a single get_feed() call.
+        """
+
+        future = self.__in_flight.get(key)
+
+        if future is None:
+            future = self.__in_flight[key] = self.__fetch(key, get_feed)
+            future.add_done_callback(lambda future: self.__in_flight.pop(key, None))
+
+        return future
+
+
+    @tornado.gen.coroutine
+    def __fetch(self, key, get_feed):
+        """Fetches a feed."""
+
+        raw_feed = yield get_feed()
+        feed = CachedFeed(key, raw_feed)
+
+        if config.FEED_CACHE_TTL > 0:
+            if config.STORE_PATH is not None:
+                store.STORE.save(key, feed.time, feed.etag, raw_feed)
+
+            if config.SHARED_CACHE_PATH is not None:
+                previous = self.__feeds.get(key)
+                if previous is not None:
+                    feed.reuse(previous)
+
+                self.__shared.save(feed)
+
+            self.__store(feed)
+
+        return feed
+
+
+    @tornado.gen.coroutine
+    def __restore(self, key):
+        """Restores a feed from the persistent store."""
+
+        stored = yield store.STORE.load(key)
+        if stored is None:
+            return
+
+        # The feed may have been fetched while it was being loaded
+        feed = self.__feeds.get(key)
+        if feed is not None:
+            return feed
+
+        feed_time, raw_feed = stored
+
+        feed = CachedFeed(key, raw_feed)
+        feed.time = feed_time
+        self.__store(feed)
+
+        return feed
+
+
+    @staticmethod
+    def __on_refreshed(future):
+        """Called when a stale feed has been refreshed in background."""
+
+        try:
+            future.result()
+        except Exception:
+            LOG.exception("Failed to refresh a cached feed.")
+
+
+    def __store(self, feed):
+        """Stores the specified feed replacing the previous one."""
+
+        previous = self.__remove(feed.key)
+        if previous is not None:
+            feed.reuse(previous)
+
+        self.__feeds[feed.key] = feed
+        self.__size += feed.size
+        self.__evict()
+
+
+    def __resized(self, feed, old_size):
+        """Accounts a change of the specified feed's size."""
+
+        if feed.size != old_size and self.__feeds.get(feed.key) is feed:
+            self.__size += feed.size - old_size
+            self.__evict()
+
+
+    def __evict(self):
+        """Evicts the least recently used feeds if the cache is full."""
+
+        while self.__size > config.FEED_CACHE_MAX_SIZE:
+            self.__remove(next(iter(self.__feeds)))
+
+
+    def __remove(self, key):
+        """Removes the specified feed from the cache."""
+
+        feed = self.__feeds.pop(key, None)
+        if feed is not None:
+            self.__size -= feed.size
+
+        return feed
+
+
+
+class DiskCache:
+    """On-disk cache of generated feeds shared between processes.
+
+    Stores the feeds in config.SHARED_CACHE_PATH directory. The files are
+    replaced atomically, so readers never see partially written feeds. Feeds
+    older than config.FEED_CACHE_TTL + config.FEED_CACHE_STALE_TTL are removed
+    periodically.
+    """
+
+    _CLEANUP_INTERVAL = 60
+    """Interval at which outdated feeds are removed."""
+
+    def __init__(self):
+        self.__last_cleanup = time.time()
+
+
+    def load(self, key):
+        """Returns a CachedFeed for the specified key or None if there is no such feed."""
+
+        try:
+            with open(self.__path(key), "rb") as cache_file:
+                metadata = json.loads(cache_file.readline().decode())
+                rss = cache_file.read()
+        except FileNotFoundError:
+            return
+        except Exception as e:
+            LOG.error("Failed to load a feed from the shared cache: %s", e)
+            return
+
+        return CachedFeed.load(key, metadata["time"], metadata["etag"], metadata["last_modified"], rss)
+
+
+    def time(self, key):
+        """Returns the time when the specified feed has been saved or None if there is no such feed."""
+
+        try:
+            return os.path.getmtime(self.__path(key))
+        except OSError:
+            return
+
+
+    def save(self, feed):
+        """Saves the specified feed.
+
+        The feed is rendered if it hasn't been rendered yet.
+        """
+
+        path = self.__path(feed.key)
+        temp_path = "{}.{}.tmp".format(path, os.getpid())
+
+        metadata = json.dumps({
+            "time":          feed.time,
+            "etag":          feed.etag,
+            "last_modified": feed.last_modified,
+        }).encode()
+
+        try:
+            with open(temp_path, "wb") as cache_file:
+                cache_file.write(metadata + b"\n")
+                cache_file.write(feed.rss())
+
+            os.replace(temp_path, path)
+        except Exception as e:
+            LOG.error("Failed to save a feed to the shared cache: %s", e)
+
+            try:
+                os.unlink(temp_path)
+            except OSError:
+                pass
+
+        if time.time() - self.__last_cleanup >= self._CLEANUP_INTERVAL:
+            self.__cleanup()
+
+
+    def __cleanup(self):
+        """Removes outdated feeds."""
+
+        self.__last_cleanup = now = time.time()
+        max_age = config.FEED_CACHE_TTL + config.FEED_CACHE_STALE_TTL
+
+        try:
+            file_names = os.listdir(config.SHARED_CACHE_PATH)
+        except OSError as e:
+            LOG.error("Failed to clean up the shared cache: %s", e)
+            return
+
+        for file_name in file_names:
+            path = os.path.join(config.SHARED_CACHE_PATH, file_name)
+
+            try:
+                if now - os.path.getmtime(path) >= max_age:
+                    os.unlink(path)
+            except FileNotFoundError:
+                # Removed by another process
+                pass
+            except OSError as e:
+                LOG.error("Failed to remove %s: %s", path, e)
+
+
+    def __path(self, key):
+        """Returns path to the file of the specified feed."""
+
+        return os.path.join(config.SHARED_CACHE_PATH, key)
+
+
+
+class MemoCache:
+    """Bounded LRU memoization cache.
+
+    Counts its hits and misses to make it possible to choose an appropriate
+    cache size. Named caches export the counters as metrics.
+    """
+
+    def __init__(self, max_size, name=None):
+        self.max_size = max_size
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.__values = collections.OrderedDict()
+
+        if name is not None:
+            _MEMO_CACHES.append(self)
+
+    def __len__(self):
+        return len(self.__values)
+
+    def clear(self):
+        """Removes all values from the cache."""
+
+        self.__values.clear()
+
+    def get(self, key, get_value):
+        """Returns a value for the specified key.
+
+        If there is no such value in the cache, obtains it by calling
+        get_value(). The values are shared between callers, so they mustn't be
+        modified.
+        """
+
+        try:
+            value = self.__values[key]
+        except KeyError:
+            self.misses += 1
+
+            value = get_value()
+            self.__values[key] = value
+
+            while len(self.__values) > self.max_size:
+                self.__values.popitem(last=False)
+        else:
+            self.hits += 1
+            self.__values.move_to_end(key)
+
+        return value
+
+
+
+class ExpiringCache:
+    """Bounded LRU cache which values expire after the specified time."""
+
+    def __init__(self, max_size, ttl):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.__values = collections.OrderedDict()
+
+    def __len__(self):
+        return len(self.__values)
+
+    def get(self, key):
+        """Returns a value for the specified key or None if there is no such value."""
+
+        try:
+            value, expire_time = self.__values[key]
+        except KeyError:
+            return
+
+        if time.time() >= expire_time:
+            del self.__values[key]
+            return
+
+        self.__values.move_to_end(key)
+
+        return value
+
+    def set(self, key, value):
+        """Sets a value for the specified key."""
+
+        self.__values.pop(key, None)
+        self.__values[key] = ( value, time.time() + self.ttl )
+
+        while len(self.__values) > self.max_size:
+            self.__values.popitem(last=False)
+
+
+
+def key(*args):
+    """Returns a cache key for the specified credentials and request arguments."""
+
+    return hashlib.sha256(repr(args).encode()).hexdigest()
+
+
+def _get_validators(feed):
+    """Returns ETag, Last-Modified time and content size of the specified feed.
+
+    The ETag is derived from the whole content of the feed, because items may
+    change without changing their IDs and times (a VK item which failed to be
+    rendered, a renamed user, etc.). Last-Modified time is the time of the
+    feed's newest item.
+    """
+
+    etag = hashlib.sha1()
+    size = 0
+    last_modified = None
+
+    data = "{}\0{}\0{}\0{}\n".format(feed.title, feed.url, feed.image, feed.description)
+    data = data.encode(errors="surrogatepass")
+    etag.update(data)
+    size += len(data)
+
+    for item in feed.items:
+        item_time = item.time
+
+        data = "{}\0{}\0{}\0{}\0{}\0{}\0{}\n".format(
+            item.id, item_time, item.url, item.author, "\1".join(item.categories), item.title, item.text)
+        data = data.encode(errors="surrogatepass")
+        etag.update(data)
+        size += len(data)
+
+        if item_time is not None and (last_modified is None or item_time > last_modified):
+            last_modified = item_time
+
+    return '"' + etag.hexdigest() + '"', last_modified, size
+
+
+FEEDS = FeedCache()
+"""Generated feeds cache."""
+
+_MEMO_CACHES = []
+"""Named memoization caches."""
+
+metrics.Collector("social_rss_feed_cache_size_bytes", "gauge",
+    "Total size of cached feeds.", lambda: [ ((), FEEDS.size) ])
+
+metrics.Collector("social_rss_memo_cache_requests_total", "counter",
+    "Number of memoization cache lookups by result.", lambda: [
+        ( ( memo_cache.name, result ), value ) for memo_cache in _MEMO_CACHES
+        for result, value in (( "hit", memo_cache.hits ), ( "miss", memo_cache.misses )) ], ("cache", "result"))
+
+metrics.Collector("social_rss_memo_cache_size", "gauge",
+    "Number of values in memoization caches.", lambda: [
+        ( ( memo_cache.name, ), len(memo_cache) ) for memo_cache in _MEMO_CACHES ], ("cache",))
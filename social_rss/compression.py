@@ -0,0 +1,58 @@
+"""Response compression."""
+
+import collections
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+_ENCODINGS = collections.OrderedDict()
+"""Supported content encodings in order of preference."""
+
+if brotli is not None:
+    _ENCODINGS["br"] = lambda data: brotli.compress(data, quality=9)
+
+_ENCODINGS["gzip"] = lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def compress(data, encoding):
+    """Compresses the data with the specified content encoding."""
+
+    return _ENCODINGS[encoding](data)
+
+
+def negotiate(accept_encoding):
+    """Chooses content encoding by Accept-Encoding header value.
+
+    Returns None if the response shouldn't be compressed.
+    """
+
+    accepted = {}
+
+    for coding in accept_encoding.split(","):
+        coding, _, params = coding.partition(";")
+
+        quality = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        accepted[coding.strip().lower()] = quality
+
+    best_encoding = None
+    best_quality = 0.0
+
+    for encoding in _ENCODINGS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > best_quality:
+            best_encoding = encoding
+            best_quality = quality
+
+    return best_encoding
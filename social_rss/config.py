@@ -14,3 +14,105 @@ OFFLINE_DEBUG_PATH = "debug"
 
 API_TIMEOUT = 10
 """Timeout for API requests."""
+
+FEED_CACHE_TTL = 60
+"""Time during which a generated feed is served from cache (0 disables the cache)."""
+
+FEED_CACHE_STALE_TTL = 10 * 60
+"""Time after FEED_CACHE_TTL during which a stale feed is served while it's being refreshed."""
+
+FEED_CACHE_MAX_SIZE = 100 * 1024 * 1024
+"""Maximum total size of cached feeds in bytes."""
+
+STORE_PATH = None
+"""Path to the SQLite database where generated feeds are persisted between restarts (None disables the store)."""
+
+STORE_MAX_SIZE = 500 * 1024 * 1024
+"""Maximum size of the persistent store in bytes."""
+
+STORE_MAX_AGE = 7 * 24 * 60 * 60
+"""Time after which feeds which aren't updated are removed from the persistent store."""
+
+SHARED_CACHE_PATH = None
+"""Path to the directory where generated feeds are shared between worker processes."""
+
+WORKER_ID = None
+"""ID of the current worker process (None if the server has no worker processes)."""
+
+VK_NEWSFEED_WINDOW = 200
+"""Number of items kept in incrementally updated VK news feeds (0 disables incremental updates)."""
+
+VK_NEWSFEED_MAX_PAGES = 5
+"""Maximum number of pages fetched during an incremental VK news feed update."""
+
+VK_NEWSFEED_FAILED_ITEM_RETRIES = 3
+"""Number of times a VK news feed item which failed to be rendered is fetched again."""
+
+VK_NEWSFEED_MAX_USERS = 1000
+"""Maximum number of users whose VK news feeds are kept in memory."""
+
+RENDERED_ITEMS_CACHE_SIZE = 10000
+"""Maximum number of rendered feed items memoized per social network."""
+
+RSS_FLUSH_CHUNKS = 50
+"""Number of RSS chunks (roughly items) after which the output is flushed to the client."""
+
+COMPRESS_RESPONSES = False
+"""Should we compress responses (gzip, or Brotli if brotli module is installed)?"""
+
+HTTP_MAX_CONNECTIONS_PER_HOST = 10
+"""Maximum number of simultaneous connections to an API host."""
+
+HTTP_IDLE_TIMEOUT = 60
+"""Time after which idle keep-alive connections to API hosts are closed."""
+
+VK_USERS_CACHE_SIZE = 10000
+"""Maximum number of VK profiles and groups kept in the shared cache."""
+
+VK_USERS_CACHE_TTL = 60 * 60
+"""Time during which VK profiles and groups are kept in the shared cache."""
+
+API_HOST_RATE_LIMIT = 20
+"""Maximum rate of requests to an API host (requests per second)."""
+
+API_HOST_RATE_LIMIT_BURST = 20
+"""Maximum burst of requests to an API host."""
+
+VK_RATE_LIMIT = 3
+"""Maximum rate of VK API requests per access token (requests per second)."""
+
+VK_RATE_LIMIT_BURST = 3
+"""Maximum burst of VK API requests per access token."""
+
+TWITTER_RATE_LIMIT = 15 / (15 * 60)
+"""Maximum rate of Twitter API requests per access token and method (requests per second)."""
+
+TWITTER_RATE_LIMIT_BURST = 15
+"""Maximum burst of Twitter API requests per access token and method."""
+
+API_RETRIES = 3
+"""Number of retries of API requests which failed due to rate limiting."""
+
+API_RETRY_DELAY = 1
+"""Initial delay before retrying an API request which failed due to rate limiting."""
+
+PREFETCH_INTERVAL = 0
+"""Interval at which recently requested feeds are prefetched (0 disables prefetching)."""
+
+PREFETCH_JITTER = 0.1
+"""Random variation of the prefetch interval (as a fraction of it)."""
+
+PREFETCH_CONCURRENCY = 5
+"""Maximum number of feeds prefetched simultaneously."""
+
+PREFETCH_MAX_IDLE_INTERVALS = 10
+"""Number of prefetch intervals after which feeds that aren't requested are no longer prefetched."""
+
+SHUTDOWN_TIMEOUT = 10
+"""Maximum time to wait for active requests to complete on shutdown."""
+
+SLOW_ITEM_THRESHOLD = None
+"""Processing time after which payloads of feed items are logged (None disables the tracing)."""
+
+SLOW_ITEM_SAMPLE_RATE = 0.1
+"""Fraction of slow feed items which payloads are logged."""
@@ -1,7 +1,50 @@
 """Core classes and tools."""
 
+import logging
+import pprint
+import random
+import time
+
+from social_rss import config
+
+LOG = logging.getLogger(__name__)
+
+
 class Error(Exception):
     """The base class for all exceptions the module raises."""
 
     def __init__(self, *args, **kwargs):
         super(Error, self).__init__(args[0].format(*args[1:], **kwargs))
+
+
+
+class LazyPformat:
+    """Pretty-prints an object only when it's converted to string.
+
+    Intended for log message arguments, so objects aren't formatted when the
+    message isn't logged.
+    """
+
+    __slots__ = ("__obj",)
+
+    def __init__(self, obj):
+        self.__obj = obj
+
+    def __str__(self):
+        return pprint.pformat(self.__obj)
+
+
+
+def trace_slow_item(start_time, payload):
+    """Logs the payload of an item which processing has taken too long.
+
+    start_time is time.perf_counter() value when the item's processing has
+    been started. Items which processing has exceeded
+    config.SLOW_ITEM_THRESHOLD are logged with config.SLOW_ITEM_SAMPLE_RATE
+    probability.
+    """
+
+    duration = time.perf_counter() - start_time
+
+    if duration >= config.SLOW_ITEM_THRESHOLD and random.random() < config.SLOW_ITEM_SAMPLE_RATE:
+        LOG.warning("Item processing has taken %.1f ms:\n%s", duration * 1000, LazyPformat(payload))
@@ -0,0 +1,67 @@
+"""Feed model."""
+
+import sys
+
+
+class Feed:
+    """A feed."""
+
+    __slots__ = ("title", "url", "image", "description", "items")
+
+    def __init__(self, title, url, image, description, items):
+        self.title = title
+        self.url = url
+        self.image = image
+        self.description = description
+        self.items = items
+
+    def to_dict(self):
+        """Returns the feed's attributes except the items as a dictionary."""
+
+        return {
+            "title":       self.title,
+            "url":         self.url,
+            "image":       self.image,
+            "description": self.description,
+        }
+
+
+
+class FeedItem:
+    """A feed item.
+
+    Rendered items are kept in memory between requests, so they have a fixed
+    set of attributes instead of a dictionary. Optional attributes are None
+    when they are missing. Category names are repeated in many items, so they
+    are interned.
+    """
+
+    __slots__ = ("id", "title", "text", "url", "author", "time", "categories")
+
+    def __init__(self, id, title, text, url=None, author=None, time=None, categories=()):
+        self.id = id
+        self.title = title
+        self.text = text
+        self.url = url
+        self.author = author
+        self.time = time
+        self.categories = tuple(sys.intern(category) for category in categories)
+
+    def to_dict(self):
+        """Returns the item as a dictionary without its missing attributes."""
+
+        item = { "id": self.id, "title": self.title, "text": self.text }
+
+        if self.url is not None:
+            item["url"] = self.url
+
+        if self.author is not None:
+            item["author"] = self.author
+
+        if self.time is not None:
+            item["time"] = self.time
+
+        if self.categories:
+            item["categories"] = list(self.categories)
+
+        return item
@@ -0,0 +1,37 @@
+"""Health check request handler."""
+
+import os
+
+import tornado.web
+
+from social_rss import cache
+from social_rss import request
+from social_rss import server
+
+
+class RequestHandler(tornado.web.RequestHandler):
+    """Health check request handler.
+
+    Reports the state of the worker process which handles the request. Returns
+    503 when the worker is shutting down, so load balancers stop sending
+    requests to it.
+    """
+
+    def initialize(self, worker_id=None):
+        self.__worker_id = worker_id
+
+    def get(self):
+        """Handles the request."""
+
+        stopping = server.stopping()
+        if stopping:
+            self.set_status(503)
+
+        self.write({
+            "status":          "stopping" if stopping else "ok",
+            "worker":          self.__worker_id,
+            "pid":             os.getpid(),
+            "uptime":          int(server.uptime()),
+            "active_requests": request.active_requests(),
+            "cached_feeds":    len(cache.FEEDS),
+        })
@@ -0,0 +1,245 @@
+"""HTTP client with a pool of keep-alive connections."""
+
+import collections
+import logging
+import ssl
+import time
+
+from urllib.parse import urlsplit
+
+import tornado.gen
+import tornado.httputil
+import tornado.ioloop
+import tornado.locks
+import tornado.util
+from tornado.http1connection import HTTP1Connection, HTTP1ConnectionParameters
+from tornado.iostream import StreamClosedError
+from tornado.tcpclient import TCPClient
+
+from social_rss import config
+from social_rss import metrics
+from social_rss.core import Error
+
+LOG = logging.getLogger(__name__)
+
+
+class Response:
+    """HTTP response."""
+
+    def __init__(self):
+        self.code = None
+        self.reason = None
+        self.headers = None
+        self.body = b""
+
+
+class ConnectionPool:
+    """A pool of keep-alive HTTP(S) connections.
+
+    Limits the number of simultaneous connections to each host by
+    config.HTTP_MAX_CONNECTIONS_PER_HOST and closes connections which have
+    been idle for more than config.HTTP_IDLE_TIMEOUT.
+    """
+
+    def __init__(self):
+        self.__tcp_client = TCPClient()
+        self.__ssl_context = ssl.create_default_context()
+
+        self.__idle = collections.defaultdict(collections.deque)
+        self.__limits = {}
+
+        self.__active = 0
+        self.__waiting = 0
+        self.__counters = collections.Counter()
+
+
+    def stats(self):
+        """Returns pool statistics."""
+
+        stats = dict.fromkeys(("requests", "connections_created", "connections_reused", "connections_evicted"), 0)
+        stats.update(self.__counters)
+        stats.update({
+            "active_connections": self.__active,
+            "idle_connections":   sum(len(connections) for connections in self.__idle.values()),
+            "waiting_requests":   self.__waiting,
+        })
+
+        return stats
+
+
+    @tornado.gen.coroutine
+    def fetch(self, url, headers=None, timeout=None):
+        """Sends a GET request to the specified URL.
+
+        Returns a future which resolves to a Response.
+        """
+
+        url = urlsplit(url)
+        https = url.scheme == "https"
+        host = url.hostname
+        port = url.port or (443 if https else 80)
+
+        path = url.path or "/"
+        if url.query:
+            path += "?" + url.query
+
+        key = (url.scheme, host, port)
+        deadline = tornado.ioloop.IOLoop.current().time() + (config.API_TIMEOUT if timeout is None else timeout)
+
+        self.__counters["requests"] += 1
+
+        try:
+            limit = self.__limits[key]
+        except KeyError:
+            limit = self.__limits[key] = tornado.locks.Semaphore(config.HTTP_MAX_CONNECTIONS_PER_HOST)
+
+        self.__waiting += 1
+        try:
+            yield limit.acquire(deadline)
+        except tornado.util.TimeoutError:
+            raise Error("Timed out while waiting for a free connection to {}.", host)
+        finally:
+            self.__waiting -= 1
+
+        self.__active += 1
+
+        try:
+            self.__evict_idle()
+
+            while True:
+                stream = self.__get_idle(key)
+                reused = stream is not None
+
+                if reused:
+                    self.__counters["connections_reused"] += 1
+                else:
+                    # Unlike the other Tornado functions, connect() accepts
+                    # only a relative timeout
+                    try:
+                        stream = yield self.__tcp_client.connect(
+                            host, port, ssl_options=self.__ssl_context if https else None,
+                            timeout=deadline - tornado.ioloop.IOLoop.current().time())
+                    except tornado.util.TimeoutError:
+                        raise Error("Timed out while connecting to {}.", host)
+
+                    self.__counters["connections_created"] += 1
+
+                try:
+                    response = yield self.__request(key, stream, url.netloc, path, headers, deadline)
+                except StreamClosedError:
+                    # The server may close a connection while it's idle
+                    if reused:
+                        LOG.debug("Pooled connection to %s has been closed by the server.", host)
+                        continue
+
+                    raise
+
+                return response
+        finally:
+            self.__active -= 1
+            limit.release()
+
+
+    @tornado.gen.coroutine
+    def __request(self, key, stream, host, path, headers, deadline):
+        """Sends a request over the specified connection."""
+
+        request_headers = tornado.httputil.HTTPHeaders({
+            "Host":            host,
+            "Accept-Encoding": "gzip",
+        })
+        request_headers.update(headers or {})
+
+        connection = HTTP1Connection(stream, True, HTTP1ConnectionParameters(decompress=True))
+        reader = _ResponseReader()
+
+        try:
+            connection.write_headers(
+                tornado.httputil.RequestStartLine("GET", path, "HTTP/1.1"), request_headers)
+            connection.finish()
+
+            try:
+                if not (yield tornado.gen.with_timeout(deadline, connection.read_response(reader),
+                                                       quiet_exceptions=StreamClosedError)):
+                    raise Error("Got an invalid HTTP response.")
+            except tornado.util.TimeoutError:
+                raise Error("Request timed out.")
+        except Exception:
+            connection.close()
+            raise
+
+        if reader.keep_alive and not stream.closed():
+            self.__idle[key].append(( connection.detach(), time.time() ))
+        else:
+            connection.close()
+
+        return reader.response
+
+
+    def __get_idle(self, key):
+        """Returns an idle connection to the specified host or None."""
+
+        connections = self.__idle.get(key)
+
+        while connections:
+            stream, idle_since = connections.pop()
+            if not stream.closed():
+                return stream
+
+
+    def __evict_idle(self):
+        """Closes connections which have been idle for too long."""
+
+        now = time.time()
+
+        for connections in self.__idle.values():
+            while connections and (
+                connections[0][0].closed() or now - connections[0][1] >= config.HTTP_IDLE_TIMEOUT
+            ):
+                stream, idle_since = connections.popleft()
+                stream.close()
+                self.__counters["connections_evicted"] += 1
+
+
+class _ResponseReader(tornado.httputil.HTTPMessageDelegate):
+    """Reads an HTTP response."""
+
+    def __init__(self):
+        self.response = Response()
+        self.keep_alive = False
+        self.__chunks = []
+
+    def headers_received(self, start_line, headers):
+        self.response.code = start_line.code
+        self.response.reason = start_line.reason
+        self.response.headers = headers
+
+        self.keep_alive = (
+            start_line.version == "HTTP/1.1" and
+            headers.get("Connection", "").lower() != "close")
+
+    def data_received(self, chunk):
+        self.__chunks.append(chunk)
+
+    def finish(self):
+        self.response.body = b"".join(self.__chunks)
+
+
+POOL = ConnectionPool()
+"""Shared connection pool."""
+
+metrics.Collector("social_rss_http_requests_total", "counter",
+    "Number of requests sent to API hosts.", lambda: [ ((), POOL.stats()["requests"]) ])
+
+metrics.Collector("social_rss_http_connection_events_total", "counter",
+    "Number of connections created, reused and evicted from the pool.", lambda: [
+        ( ( event, ), POOL.stats()["connections_" + event] ) for event in ("created", "reused", "evicted") ],
+    ("event",))
+
+metrics.Collector("social_rss_http_connections", "gauge",
+    "Number of active and idle connections to API hosts.", lambda: [
+        ( ( state, ), POOL.stats()[state + "_connections"] ) for state in ("active", "idle") ],
+    ("state",))
+
+metrics.Collector("social_rss_http_waiting_requests", "gauge",
+    "Number of requests waiting for a free connection.", lambda: [ ((), POOL.stats()["waiting_requests"]) ])
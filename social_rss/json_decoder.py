@@ -0,0 +1,30 @@
+"""JSON decoding of API responses."""
+
+import codecs
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def loads(data, charset="utf-8"):
+    """Decodes a JSON document from bytes in the specified charset.
+
+    UTF-8 documents are parsed without an intermediate string and by orjson if
+    it's installed. orjson is stricter than the json module (it rejects NaN and
+    integers which don't fit into 64 bits), so documents which it rejects are
+    parsed by the json module as a fallback.
+    """
+
+    if codecs.lookup(charset).name != "utf-8":
+        return json.loads(data.decode(charset))
+
+    if orjson is not None:
+        try:
+            return orjson.loads(data)
+        except orjson.JSONDecodeError:
+            pass
+
+    return json.loads(data)
@@ -0,0 +1,217 @@
+"""Prometheus metrics."""
+
+import abc
+import bisect
+import time
+
+import tornado.web
+
+from social_rss import config
+
+_DURATION_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+"""Default histogram buckets for durations in seconds."""
+
+_METRICS = []
+"""All registered metrics."""
+
+
+class _Metric(abc.ABC):
+    """Base class for all metrics."""
+
+    type = None
+
+    def __init__(self, name, description, labels=()):
+        self.name = name
+        self.description = description
+        self.labels = labels
+
+        _METRICS.append(self)
+
+    def label_names(self, suffix):
+        """Returns label names of the samples with the specified name suffix."""
+
+        return self.labels
+
+    @abc.abstractmethod
+    def samples(self):
+        """Returns an iterable of (name suffix, label values, value) tuples."""
+
+
+class Counter(_Metric):
+    """A counter which may have labels."""
+
+    type = "counter"
+
+    def __init__(self, name, description, labels=()):
+        super(Counter, self).__init__(name, description, labels)
+        self.__values = {}
+
+    def inc(self, *label_values, value=1):
+        """Increments the counter with the specified label values."""
+
+        self.__values[label_values] = self.__values.get(label_values, 0) + value
+
+    def samples(self):
+        for label_values, value in self.__values.items():
+            yield "", label_values, value
+
+
+class Histogram(_Metric):
+    """A histogram which may have labels."""
+
+    type = "histogram"
+
+    def __init__(self, name, description, labels=(), buckets=_DURATION_BUCKETS):
+        super(Histogram, self).__init__(name, description, labels)
+        self.buckets = buckets
+        self.__values = {}
+
+    def observe(self, value, *label_values):
+        """Observes the specified value."""
+
+        try:
+            counts = self.__values[label_values]
+        except KeyError:
+            # Bucket counts including +Inf bucket, then the sum and the count
+            # of the observed values
+            counts = self.__values[label_values] = [0] * (len(self.buckets) + 3)
+
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        counts[-2] += value
+        counts[-1] += 1
+
+    def time(self, *label_values):
+        """Returns a context manager which observes the duration of its block."""
+
+        return _Timer(self, label_values)
+
+    def samples(self):
+        for label_values, counts in self.__values.items():
+            cumulative = 0
+
+            for bucket, count in zip(self.buckets, counts):
+                cumulative += count
+                yield "_bucket", label_values + (_format_value(bucket),), cumulative
+
+            yield "_bucket", label_values + ("+Inf",), counts[-1]
+            yield "_sum", label_values, counts[-2]
+            yield "_count", label_values, counts[-1]
+
+    def label_names(self, suffix):
+        return self.labels + ("le",) if suffix == "_bucket" else self.labels
+
+
+class Collector(_Metric):
+    """A metric which values are collected on scrape.
+
+    collect is a callable which returns an iterable of (label values, value)
+    tuples.
+    """
+
+    def __init__(self, name, metric_type, description, collect, labels=()):
+        super(Collector, self).__init__(name, description, labels)
+        self.type = metric_type
+        self.__collect = collect
+
+    def samples(self):
+        for label_values, value in self.__collect():
+            yield "", label_values, value
+
+
+class _Timer:
+    """Observes duration of a block of code."""
+
+    __slots__ = ("__histogram", "__label_values", "__start")
+
+    def __init__(self, histogram, label_values):
+        self.__histogram = histogram
+        self.__label_values = label_values
+
+    def __enter__(self):
+        self.__start = time.perf_counter()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.__histogram.observe(time.perf_counter() - self.__start, *self.__label_values)
+
+
+
+class RequestHandler(tornado.web.RequestHandler):
+    """Metrics request handler."""
+
+    def get(self):
+        """Handles the request."""
+
+        self.set_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.write(render())
+
+
+
+def render():
+    """Renders all metrics in Prometheus text format.
+
+    Each worker process has its own metrics, so their samples are labeled with
+    the worker ID.
+    """
+
+    lines = []
+
+    for metric in _METRICS:
+        lines.append("# HELP {} {}".format(metric.name, metric.description))
+        lines.append("# TYPE {} {}".format(metric.name, metric.type))
+
+        for suffix, label_values, value in metric.samples():
+            labels = metric.label_names(suffix)
+
+            if config.WORKER_ID is not None:
+                labels = ( "worker", ) + labels
+                label_values = ( config.WORKER_ID, ) + tuple(label_values)
+
+            if labels:
+                lines.append("{}{}{{{}}} {}".format(metric.name, suffix, ",".join(
+                    '{}="{}"'.format(label, _escape_label(label_value))
+                    for label, label_value in zip(labels, label_values)), _format_value(value)))
+            else:
+                lines.append("{}{} {}".format(metric.name, suffix, _format_value(value)))
+
+    return "\n".join(lines) + "\n"
+
+
+def _escape_label(value):
+    """Escapes a label value."""
+
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_value(value):
+    """Formats a sample value."""
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+
+REQUESTS = Counter("social_rss_requests_total",
+    "Number of processed requests.", ("handler", "code"))
+
+REQUEST_DURATION = Histogram("social_rss_request_duration_seconds",
+    "Request processing time.", ("handler",))
+
+FEED_CACHE_REQUESTS = Counter("social_rss_feed_cache_requests_total",
+    "Number of feed cache lookups by result.", ("result",))
+
+API_REQUEST_DURATION = Histogram("social_rss_api_request_duration_seconds",
+    "Time of waiting for API responses.", ("api",))
+
+API_RESPONSE_DECODING_DURATION = Histogram("social_rss_api_response_decoding_duration_seconds",
+    "Time of decoding API responses.", ("api",))
+
+API_ERRORS = Counter("social_rss_api_errors_total",
+    "Number of API errors by error code.", ("api", "code"))
+
+FEED_PROCESSING_DURATION = Histogram("social_rss_feed_processing_duration_seconds",
+    "Time of generating feed items from API responses.", ("feed",))
+
+RSS_GENERATION_DURATION = Histogram("social_rss_rss_generation_duration_seconds",
+    "Time of generating RSS.")
+
+RSS_WRITE_DURATION = Histogram("social_rss_rss_write_duration_seconds",
+    "Time of writing RSS to the client including its generation.")
@@ -0,0 +1,106 @@
+"""Background prefetching of feeds."""
+
+import logging
+import time
+
+import tornado.gen
+import tornado.ioloop
+import tornado.locks
+
+from social_rss import cache
+from social_rss import config
+from social_rss import rate_limit
+
+LOG = logging.getLogger(__name__)
+
+
+class Scheduler:
+    """Feed prefetch scheduler.
+
+    Tracks recently requested feeds and refreshes them in the feed cache every
+    config.PREFETCH_INTERVAL seconds, so clients are served from memory
+    instead of waiting for the API. Feeds which haven't been requested for
+    config.PREFETCH_MAX_IDLE_INTERVALS intervals are dropped from the schedule.
+
+    Each worker process has its own scheduler, so feeds which have just been
+    refreshed by another worker via the shared cache are skipped.
+    """
+
+    def __init__(self):
+        self.__feeds = {}
+        self.__callback = None
+
+
+    def __len__(self):
+        return len(self.__feeds)
+
+
+    def start(self):
+        """Starts the scheduler in the current IOLoop."""
+
+        if self.__callback is not None:
+            return
+
+        self.__callback = tornado.ioloop.PeriodicCallback(
+            self.__prefetch, config.PREFETCH_INTERVAL * 1000, jitter=config.PREFETCH_JITTER)
+        self.__callback.start()
+
+
+    def stop(self):
+        """Stops the scheduler."""
+
+        if self.__callback is not None:
+            self.__callback.stop()
+            self.__callback = None
+
+
+    def track(self, key, get_feed):
+        """Registers a request of the feed with the specified cache key.
+
+        get_feed is a callable which returns a future resolving to the feed.
+        It's kept while the feed is tracked, so it mustn't reference the
+        request.
+        """
+
+        if self.__callback is not None:
+            self.__feeds[key] = ( get_feed, time.time() )
+
+
+    @tornado.gen.coroutine
+    def __prefetch(self):
+        """Refreshes all tracked feeds."""
+
+        now = time.time()
+        max_idle_time = config.PREFETCH_INTERVAL * config.PREFETCH_MAX_IDLE_INTERVALS
+
+        for key, ( get_feed, requested ) in list(self.__feeds.items()):
+            if now - requested >= max_idle_time:
+                del self.__feeds[key]
+
+        if not self.__feeds:
+            return
+
+        LOG.debug("Prefetching %s feeds...", len(self.__feeds))
+
+        limit = tornado.locks.Semaphore(config.PREFETCH_CONCURRENCY)
+
+        yield [
+            self.__refresh(limit, key, get_feed)
+            for key, ( get_feed, requested ) in list(self.__feeds.items()) ]
+
+
+    @tornado.gen.coroutine
+    def __refresh(self, limit, key, get_feed):
+        """Refreshes the specified feed."""
+
+        with (yield limit.acquire()):
+            try:
+                yield cache.FEEDS.refresh(key, get_feed)
+            except rate_limit.RateLimitExceeded as e:
+                LOG.warning("Failed to prefetch a feed: %s", e)
+            except Exception:
+                LOG.exception("Failed to prefetch a feed.")
+
+
+SCHEDULER = Scheduler()
+"""Shared prefetch scheduler."""
@@ -0,0 +1,184 @@
+"""API rate limiting."""
+
+import collections
+import logging
+import random
+
+import tornado.gen
+import tornado.ioloop
+
+from social_rss import config
+from social_rss import metrics
+from social_rss.core import Error
+
+LOG = logging.getLogger(__name__)
+
+
+class RateLimitExceeded(Error):
+    """Raised when a request can't be sent due to rate limiting."""
+
+
+class TokenBucket:
+    """Token bucket rate limiter.
+
+    Allows rate requests per second on average with bursts of up to burst
+    requests. Requests which exceed the limit are queued in FIFO order.
+    """
+
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.__tokens = burst
+        self.__updated = tornado.ioloop.IOLoop.current().time()
+
+    def delay(self):
+        """Returns time after which the next request may be sent."""
+
+        now = tornado.ioloop.IOLoop.current().time()
+
+        self.__tokens = min(self.burst, self.__tokens + (now - self.__updated) * self.rate)
+        self.__updated = now
+
+        # Tokens may go negative which means that there are queued requests
+        # that have reserved the next tokens.
+        return max(0, (1 - self.__tokens) / self.rate)
+
+    def take(self):
+        """Reserves a token for the next request."""
+
+        self.__tokens -= 1
+
+    def block(self, delay):
+        """Makes the next request wait for at least the specified time."""
+
+        self.delay()
+        self.__tokens = min(self.__tokens, 1 - delay * self.rate)
+
+
+_STATS = collections.Counter()
+"""Rate limiting statistics."""
+
+_LIMITERS = collections.OrderedDict()
+"""Rate limiters of recently used access tokens and API hosts."""
+
+_MAX_LIMITERS = 10000
+"""Maximum number of rate limiters to keep."""
+
+
+def get_limiter(key, rate, burst):
+    """Returns a shared rate limiter with the specified key."""
+
+    try:
+        limiter = _LIMITERS.pop(key)
+    except KeyError:
+        limiter = TokenBucket(rate, burst)
+
+        while len(_LIMITERS) >= _MAX_LIMITERS:
+            _LIMITERS.popitem(last=False)
+
+    _LIMITERS[key] = limiter
+
+    return limiter
+
+
+@tornado.gen.coroutine
+def acquire(limiters):
+    """Waits until a request can be sent under all the specified limiters.
+
+    Raises RateLimitExceeded if it'd have to wait for more than
+    config.API_TIMEOUT. Tokens are taken only if none of the limiters rejects
+    the request.
+    """
+
+    delay = max(limiter.delay() for limiter in limiters)
+    if delay > config.API_TIMEOUT:
+        _STATS["rejected_requests"] += 1
+        raise RateLimitExceeded("Rate limit exceeded.")
+
+    for limiter in limiters:
+        limiter.take()
+
+    _STATS["requests"] += 1
+
+    if delay:
+        _STATS["delayed_requests"] += 1
+        _STATS["wait_time"] += delay
+        _STATS["max_wait_time"] = max(_STATS["max_wait_time"], delay)
+
+        _STATS["waiting_requests"] += 1
+        try:
+            yield tornado.gen.sleep(delay)
+        finally:
+            _STATS["waiting_requests"] -= 1
+
+
+@tornado.gen.coroutine
+def call(request, limiters, is_rate_limit_error):
+    """Sends an API request under the specified rate limiters.
+
+    request is a callable which sends the request and returns a future. If the
+    request fails with an error for which is_rate_limit_error() returns True,
+    it's retried with jittered exponential backoff up to config.API_RETRIES
+    times, after which RateLimitExceeded is raised.
+
+    If the error has a retry_after attribute which isn't None, it's the time
+    after which the limit is reset. In this case the last (the most specific)
+    limiter is blocked until the reset, and if it's later than
+    config.API_TIMEOUT, RateLimitExceeded is raised at once, so the following
+    requests are rejected without being sent too.
+    """
+
+    for attempt in range(config.API_RETRIES + 1):
+        yield acquire(limiters)
+
+        try:
+            response = yield request()
+        except Exception as e:
+            if not is_rate_limit_error(e):
+                raise
+
+            retry_after = getattr(e, "retry_after", None)
+            if retry_after is not None:
+                limiters[-1].block(retry_after)
+
+            if attempt == config.API_RETRIES or retry_after is not None and retry_after > config.API_TIMEOUT:
+                raise RateLimitExceeded("{}", e)
+
+            if retry_after is None:
+                delay = config.API_RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5)
+            else:
+                # The next acquire() waits for the limit reset
+                delay = retry_after
+
+            LOG.warning("%s Retrying in %.1f seconds...", e, delay)
+            _STATS["retries"] += 1
+
+            if retry_after is None:
+                yield tornado.gen.sleep(delay)
+        else:
+            return response
+
+
+def stats():
+    """Returns rate limiting statistics."""
+
+    stats = dict.fromkeys((
+        "requests", "delayed_requests", "rejected_requests", "waiting_requests",
+        "retries", "wait_time", "max_wait_time"), 0)
+    stats.update(_STATS)
+
+    return stats
+
+
+metrics.Collector("social_rss_rate_limited_requests_total", "counter",
+    "Number of API requests by rate limiting result.", lambda: [
+        ( ( result, ), stats()[result + "_requests"] ) for result in ("delayed", "rejected") ], ("result",))
+
+metrics.Collector("social_rss_rate_limit_retries_total", "counter",
+    "Number of API requests retried due to rate limit errors.", lambda: [ ((), stats()["retries"]) ])
+
+metrics.Collector("social_rss_rate_limit_wait_seconds_total", "counter",
+    "Total time API requests waited due to rate limiting.", lambda: [ ((), stats()["wait_time"]) ])
+
+metrics.Collector("social_rss_rate_limit_waiting_requests", "gauge",
+    "Number of API requests waiting due to rate limiting.", lambda: [ ((), stats()["waiting_requests"]) ])
@@ -2,15 +2,55 @@
 
 import base64
 import binascii
+import email.utils
 
+import tornado.gen
+import tornado.httputil
 import tornado.web
+from tornado.iostream import StreamClosedError
+
+from social_rss import cache
+from social_rss import compression
+from social_rss import config
+from social_rss import metrics
+from social_rss import prefetch
+
+
+_ACTIVE_REQUESTS = 0
+"""Number of requests which are being processed."""
+
+
+def active_requests():
+    """Returns the number of requests which are being processed."""
+
+    return _ACTIVE_REQUESTS
 
-import social_rss.rss
 
 
 class BaseRequestHandler(tornado.web.RequestHandler):
     """Base class for all request handlers."""
 
+    __active = False
+
+    def prepare(self):
+        global _ACTIVE_REQUESTS
+
+        _ACTIVE_REQUESTS += 1
+        self.__active = True
+
+
+    def on_finish(self):
+        global _ACTIVE_REQUESTS
+
+        if self.__active:
+            _ACTIVE_REQUESTS -= 1
+            self.__active = False
+
+        handler = type(self).__module__.rpartition(".")[2]
+        metrics.REQUESTS.inc(handler, self.get_status())
+        metrics.REQUEST_DURATION.observe(self.request.request_time(), handler)
+
+
     def _get_credentials(self):
         """Returns HTTP Basic Access Authentication credentials."""
 
@@ -42,8 +82,81 @@ class BaseRequestHandler(tornado.web.RequestHandler):
         self.set_status(401)
 
 
-    def _write_rss(self, feed):
-        """Writes the specified RSS feed to the output buffer."""
+    @tornado.gen.coroutine
+    def _write_feed(self, cache_key, get_feed):
+        """Writes the specified feed to the output buffer.
+
+        cache_key is a tuple of credentials and request arguments which
+        identifies the feed. get_feed is a callable which returns a future
+        resolving to the feed and is called only when there is no
+        appropriate feed in the cache. It's kept by the prefetch scheduler, so
+        it mustn't reference the request handler.
+        """
+
+        cache_key = cache.key(*cache_key)
+        prefetch.SCHEDULER.track(cache_key, get_feed)
+
+        feed = yield cache.FEEDS.get(cache_key, get_feed)
+
+        if config.COMPRESS_RESPONSES:
+            self.set_header("Vary", "Accept-Encoding")
+            encoding = compression.negotiate(self.request.headers.get("Accept-Encoding", ""))
+        else:
+            encoding = None
+
+        # Different representations must have different strong ETags
+        self.set_header("Etag", feed.etag if encoding is None else feed.etag[:-1] + "-" + encoding + '"')
+        if feed.last_modified is not None:
+            self.set_header("Last-Modified", tornado.httputil.format_timestamp(feed.last_modified))
+
+        if self.__not_modified(feed):
+            self.set_status(304)
+            return
+
+        if encoding is None:
+            yield self._write_rss(feed.iter_rss())
+        else:
+            # Compressed RSS is cached, so it's written at once instead of being streamed
+            self.set_header("Content-Encoding", encoding)
+            yield self._write_rss([ cache.FEEDS.compressed_rss(feed, encoding) ])
+
+
+    @tornado.gen.coroutine
+    def _write_rss(self, chunks):
+        """Writes the specified RSS chunks to the client.
+
+        The output is flushed every config.RSS_FLUSH_CHUNKS chunks, so large
+        feeds are sent to the client while they're being generated. Generation
+        waits for the flushed data to be sent, so slow clients don't make the
+        output buffer grow.
+        """
 
         self.set_header("Content-Type", "application/rss+xml")
-        self.write(social_rss.rss.generate(feed))
+
+        with metrics.RSS_WRITE_DURATION.time():
+            for chunk_id, chunk in enumerate(chunks, 1):
+                self.write(chunk)
+
+                if chunk_id % config.RSS_FLUSH_CHUNKS == 0:
+                    try:
+                        yield self.flush()
+                    except StreamClosedError:
+                        # The client has closed the connection
+                        return
+
+
+    def __not_modified(self, feed):
+        """Checks whether the client has an up to date version of the feed."""
+
+        if "If-None-Match" in self.request.headers:
+            return self.check_etag_header()
+
+        if_modified_since = self.request.headers.get("If-Modified-Since")
+        if if_modified_since is None or feed.last_modified is None:
+            return False
+
+        if_modified_since = email.utils.parsedate_tz(if_modified_since)
+        if if_modified_since is None:
+            return False
+
+        return feed.last_modified <= email.utils.mktime_tz(if_modified_since)
@@ -10,34 +10,164 @@ import tornado.escape
 import tornado.template
 
 from social_rss import config
+from social_rss import metrics
 
 
 TEMPLATE_LOADER = tornado.template.Loader(os.path.dirname(__file__), autoescape=None)
 """Template loader."""
 
 
-def generate(feed):
-    """Generates an RSS."""
+_CHANNEL_HEADER = (
+    '<?xml version="1.0"?><rss version="2.0"><channel>'
+    "<title>{title}</title><link>{url}</link><description>{description}</description>"
+    "<image><title>{title}</title><link>{url}</link><url>{image}</url></image>")
+"""Channel header."""
 
-    rss =  TEMPLATE_LOADER.load("rss.rss").generate(
-        feed=feed, date=_date, escape=xml.sax.saxutils.escape)
-    if not config.DEBUG_MODE:
-        rss = re.sub(br">\s+<", b"><", rss)
+_CHANNEL_FOOTER = b"</channel></rss>\n"
+"""Channel footer."""
 
-    return rss
+_WHITESPACE = " \t\n\r\f\v"
+"""Whitespace characters which are removed by compaction of template output."""
+
+_WEEK_DAY_NAMES = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+"""Week day names for RFC 822 dates."""
+
+_MONTH_NAMES = (None, "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+"""Month names for RFC 822 dates."""
+
+_DATES = {}
+"""Cache of formatted dates.
+
+Items are rendered with their publication dates on every feed request, but
+most of them stay the same between the requests.
+"""
+
+_DATES_CACHE_SIZE = 10000
+"""Maximum number of cached dates."""
+
+
+def generate(feed, use_template=False):
+    """Generates an RSS.
+
+    By default the RSS is generated by the compact serializer. If use_template
+    is True, the RSS is generated from the template, which output is compacted
+    unless we are in debug mode. Both ways produce the same compact RSS.
+    """
+
+    if use_template:
+        rss = TEMPLATE_LOADER.load("rss.rss").generate(
+            feed=feed, date=_date, escape=xml.sax.saxutils.escape)
+        if not config.DEBUG_MODE:
+            rss = re.sub(br">\s+<", b"><", rss)
+
+        return rss
+
+    return b"".join(iter_rss(feed))
+
+
+def iter_rss(feed):
+    """Generates an RSS chunk by chunk.
+
+    Yields the channel header, then each item, then the channel footer. The
+    chunks form a compact XML document. In debug mode a human readable RSS is
+    generated from the template as a single chunk.
+    """
+
+    if config.DEBUG_MODE:
+        with metrics.RSS_GENERATION_DURATION.time():
+            rss = generate(feed, use_template=True)
+
+        yield rss
+        return
+
+    # Time spent by the consumer between the chunks isn't accounted
+    start_time = time.perf_counter()
+
+    header = _CHANNEL_HEADER.format(
+        title=_escape(feed.title), url=_escape(feed.url),
+        description=_escape(feed.description), image=_escape(feed.image)
+    ).encode()
+
+    duration = time.perf_counter() - start_time
+    yield header
+
+    for item in feed.items:
+        start_time = time.perf_counter()
+        chunk = _item(item)
+        duration += time.perf_counter() - start_time
+        yield chunk
+
+    metrics.RSS_GENERATION_DURATION.observe(duration)
+
+    yield _CHANNEL_FOOTER
+
+
+def _escape(text):
+    """Escapes the specified text.
+
+    Whitespace-only texts are dropped to get the same output as the template
+    produces after whitespace compaction.
+    """
+
+    if "&" in text:
+        text = text.replace("&", "&amp;")
+
+    if "<" in text:
+        text = text.replace("<", "&lt;")
+
+    if ">" in text:
+        text = text.replace(">", "&gt;")
+
+    if text[:1] in _WHITESPACE and not text.strip(_WHITESPACE):
+        return ""
+
+    return text
+
+
+def _item(item):
+    """Generates an RSS item."""
+
+    escape = _escape
+
+    rss = [
+        "<item><title>", escape(item.title),
+        "</title><description>", escape(item.text),
+        '</description><guid isPermaLink="false">', escape(item.id), "</guid>",
+    ]
+
+    if item.time is not None:
+        rss += ("<pubDate>", _date(item.time), "</pubDate>")
+
+    if item.url is not None:
+        rss += ("<link>", escape(item.url), "</link>")
+
+    if item.author is not None:
+        rss += ("<author>", escape(item.author), "</author>")
+
+    for category in item.categories:
+        rss += ("<category>", escape(category), "</category>")
+
+    rss.append("</item>")
+
+    return "".join(rss).encode()
 
 
 def _date(timestamp):
     """Formats the specified timestamp according to RFC 822."""
 
-    week_day_name = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+    try:
+        return _DATES[timestamp]
+    except KeyError:
+        pass
+
+    year, month, day, hour, minute, second, week_day = time.gmtime(timestamp)[:7]
+
+    date = "{}, {:02d} {} {:4d} {:02d}:{:02d}:{:02d} GMT".format(
+        _WEEK_DAY_NAMES[week_day], day, _MONTH_NAMES[month], year, hour, minute, second)
 
-    month_name = [
-        "Jan", "Feb", "Mar", "Apr", "May", "Jun",
-        "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+    if len(_DATES) >= _DATES_CACHE_SIZE:
+        _DATES.clear()
 
-    year, month, day, hour, min, sec, wday, yday, isdst = time.gmtime(timestamp)
+    _DATES[timestamp] = date
 
-    return "{wday}, {day:02d} {month} {year:4d} {hour:02d}:{min:02d}:{sec:02d} GMT".format(
-        wday=week_day_name[wday], day=day, month=month_name[month-1],
-        year=year, hour=hour, min=min, sec=sec)
+    return date
@@ -0,0 +1,173 @@
+"""Server process management."""
+
+import logging
+import os
+import signal
+import sys
+import time
+
+import tornado.gen
+import tornado.httpserver
+import tornado.ioloop
+import tornado.web
+
+from social_rss import config
+from social_rss import metrics
+from social_rss import prefetch
+from social_rss import request
+
+LOG = logging.getLogger(__name__)
+
+_RESTART_DELAY = 1
+"""Delay before restarting a crashed worker."""
+
+_START_TIME = time.time()
+"""Time when the server has been started."""
+
+_STOPPING = False
+"""Whether the server is shutting down."""
+
+
+def stopping():
+    """Returns True if the server is shutting down."""
+
+    return _STOPPING
+
+
+def uptime():
+    """Returns the server process uptime."""
+
+    return time.time() - _START_TIME
+
+
+def fork_workers(num_workers):
+    """Forks the specified number of worker processes.
+
+    Returns worker ID in the worker processes. The parent process never
+    returns: it supervises the workers restarting the crashed ones and
+    terminates them on SIGTERM or SIGINT.
+    """
+
+    workers = {}
+
+    def start_worker(worker_id):
+        global _START_TIME
+
+        pid = os.fork()
+        if pid == 0:
+            _START_TIME = time.time()
+
+            # SIGINT from terminal is sent to the whole process group, so let
+            # the parent process stop the workers gracefully.
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            return True
+
+        LOG.info("Started worker #%s (pid %s).", worker_id, pid)
+        workers[pid] = worker_id
+        return False
+
+    def stop_workers(signum, frame):
+        global _STOPPING
+
+        if not _STOPPING:
+            LOG.info("Stopping the workers...")
+            _STOPPING = True
+
+        for pid in workers:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    for worker_id in range(num_workers):
+        if start_worker(worker_id):
+            return worker_id
+
+    signal.signal(signal.SIGTERM, stop_workers)
+    signal.signal(signal.SIGINT, stop_workers)
+
+    while workers:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+
+        worker_id = workers.pop(pid, None)
+        if worker_id is None:
+            continue
+
+        if _STOPPING:
+            LOG.info("Worker #%s (pid %s) has stopped.", worker_id, pid)
+            continue
+
+        if os.WIFSIGNALED(status):
+            LOG.error("Worker #%s (pid %s) has been killed by signal %s. Restarting it...",
+                worker_id, pid, os.WTERMSIG(status))
+        else:
+            LOG.error("Worker #%s (pid %s) has exited with status %s. Restarting it...",
+                worker_id, pid, os.WEXITSTATUS(status))
+
+        time.sleep(_RESTART_DELAY)
+
+        if not _STOPPING and start_worker(worker_id):
+            return worker_id
+
+    sys.exit(0)
+
+
+def serve(application, sockets, metrics_sockets=None):
+    """Serves the application on the specified sockets.
+
+    If metrics_sockets are specified, the metrics are also served on them, so
+    metrics of every worker process can be scraped separately.
+
+    Returns when the server is stopped by SIGTERM. On stop the server stops
+    accepting new connections and waits up to config.SHUTDOWN_TIMEOUT for
+    active requests to complete.
+    """
+
+    io_loop = tornado.ioloop.IOLoop.current()
+
+    server = tornado.httpserver.HTTPServer(application)
+    server.add_sockets(sockets)
+    servers = [ server ]
+
+    if metrics_sockets is not None:
+        metrics_server = tornado.httpserver.HTTPServer(
+            tornado.web.Application([ ("/metrics", metrics.RequestHandler) ]))
+        metrics_server.add_sockets(metrics_sockets)
+        servers.append(metrics_server)
+
+    io_loop.asyncio_loop.add_signal_handler(signal.SIGTERM, io_loop.add_callback, _shutdown, servers)
+
+    io_loop.start()
+
+
+@tornado.gen.coroutine
+def _shutdown(servers):
+    """Gracefully stops the server."""
+
+    global _STOPPING
+
+    if _STOPPING:
+        return
+
+    _STOPPING = True
+    LOG.info("Shutting down...")
+
+    for server in servers:
+        server.stop()
+
+    prefetch.SCHEDULER.stop()
+
+    io_loop = tornado.ioloop.IOLoop.current()
+    deadline = io_loop.time() + config.SHUTDOWN_TIMEOUT
+
+    while request.active_requests() and io_loop.time() < deadline:
+        yield tornado.gen.sleep(0.1)
+
+    if request.active_requests():
+        LOG.warning("Shutting down with %s active requests.", request.active_requests())
+
+    io_loop.stop()
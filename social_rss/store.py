@@ -0,0 +1,237 @@
+"""Persistent feed store."""
+
+import concurrent.futures
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+from social_rss import config
+from social_rss.feed import Feed, FeedItem
+
+LOG = logging.getLogger(__name__)
+
+
+class Store:
+    """Persistent store of generated feeds.
+
+    Keeps the last version of every feed and its rendered items in SQLite
+    database at config.STORE_PATH, so after restart the feeds can be served
+    without waiting for the APIs. The database is opened lazily on first use
+    and feeds are loaded only when they're requested.
+
+    The database is shared by all workers and a write may wait for other
+    workers' transactions, so feeds are saved in background by a writer thread
+    which has its own connection. If a feed is updated again while it's waiting
+    to be saved, only its last version is saved. Feeds are loaded by a reader
+    thread, so the IOLoop isn't blocked by the database either.
+
+    Feeds which haven't been updated during config.STORE_MAX_AGE are removed
+    periodically. If the database grows larger than config.STORE_MAX_SIZE, the
+    least recently updated feeds are removed as well.
+    """
+
+    _MAINTENANCE_INTERVAL = 60 * 60
+    """Interval at which outdated feeds are removed."""
+
+    def __init__(self):
+        self.__local = threading.local()
+        self.__last_maintenance = time.time()
+
+        self.__reader = None
+        self.__writer = None
+        self.__pending = {}
+        self.__lock = threading.Lock()
+
+
+    def load(self, key):
+        """Loads the feed with the specified key in background.
+
+        Returns a concurrent.futures.Future which resolves to a (time, feed)
+        tuple or to None if there is no such feed.
+        """
+
+        if self.__reader is None:
+            self.__reader = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="store-reader")
+
+        return self.__reader.submit(self.__load, key)
+
+
+    def save(self, key, feed_time, etag, feed):
+        """Saves the specified feed in background.
+
+        Returns a concurrent.futures.Future which resolves when the feed is
+        saved.
+        """
+
+        with self.__lock:
+            pending = self.__pending.get(key)
+            future = self.__get_writer().submit(self.__save, key) if pending is None else pending[1]
+            self.__pending[key] = ( ( feed_time, etag, feed ), future )
+
+        return future
+
+
+    def compact(self):
+        """Removes outdated feeds and limits the size of the database in background.
+
+        Returns a concurrent.futures.Future which resolves when it's done.
+        """
+
+        return self.__get_writer().submit(self.__compact)
+
+
+    def __load(self, key):
+        """Loads the feed with the specified key."""
+
+        try:
+            db = self.__get_db()
+
+            row = db.execute("SELECT time, data FROM feeds WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return
+
+            feed_time, data = row
+
+            items = [
+                FeedItem(**json.loads(item)) for item, in db.execute(
+                    "SELECT data FROM items WHERE feed = ? ORDER BY position", (key,)) ]
+
+            feed = Feed(items=items, **json.loads(data))
+        except Exception as e:
+            LOG.error("Failed to load a feed from the store: %s", e)
+            return
+
+        return feed_time, feed
+
+
+    def __save(self, key):
+        """Saves a pending feed.
+
+        The items are rewritten only when the feed's content has changed.
+        """
+
+        with self.__lock:
+            feed_time, etag, feed = self.__pending.pop(key)[0]
+
+        try:
+            db = self.__get_db()
+
+            with db:
+                row = db.execute("SELECT etag FROM feeds WHERE key = ?", (key,)).fetchone()
+
+                if row is not None and row[0] == etag:
+                    db.execute("UPDATE feeds SET time = ? WHERE key = ?", (feed_time, key))
+                else:
+                    data = json.dumps(feed.to_dict())
+                    db.execute("INSERT OR REPLACE INTO feeds (key, time, etag, data) VALUES (?, ?, ?, ?)",
+                        (key, feed_time, etag, data))
+
+                    db.execute("DELETE FROM items WHERE feed = ?", (key,))
+                    db.executemany("INSERT INTO items (feed, id, position, data) VALUES (?, ?, ?, ?)", (
+                        (key, item.id, position, json.dumps(item.to_dict()))
+                        for position, item in enumerate(feed.items) ))
+        except Exception as e:
+            LOG.error("Failed to save a feed to the store: %s", e)
+            return
+
+        if time.time() - self.__last_maintenance >= self._MAINTENANCE_INTERVAL:
+            self.__compact()
+
+
+    def __compact(self):
+        """Removes outdated feeds and limits the size of the database."""
+
+        self.__last_maintenance = time.time()
+
+        try:
+            db = self.__get_db()
+
+            with db:
+                removed = db.execute("DELETE FROM feeds WHERE time < ?",
+                    (time.time() - config.STORE_MAX_AGE,)).rowcount
+
+                while self.__size(db) > config.STORE_MAX_SIZE:
+                    feeds = db.execute("SELECT COUNT(*) FROM feeds").fetchone()[0]
+                    if not feeds:
+                        break
+
+                    removed += db.execute(
+                        "DELETE FROM feeds WHERE key IN (SELECT key FROM feeds ORDER BY time LIMIT ?)",
+                        (max(1, feeds // 10),)).rowcount
+
+                    db.execute("DELETE FROM items WHERE feed NOT IN (SELECT key FROM feeds)")
+                    db.execute("PRAGMA incremental_vacuum")
+
+                db.execute("DELETE FROM items WHERE feed NOT IN (SELECT key FROM feeds)")
+
+            db.execute("PRAGMA incremental_vacuum")
+        except Exception as e:
+            LOG.error("Failed to compact the store: %s", e)
+            return
+
+        if removed:
+            LOG.info("Removed %s feeds from the store.", removed)
+
+
+    def __get_writer(self):
+        """Returns the writer thread's executor.
+
+        It's created on first use, so worker processes don't inherit it.
+        """
+
+        if self.__writer is None:
+            self.__writer = concurrent.futures.ThreadPoolExecutor(1, thread_name_prefix="store-writer")
+
+        return self.__writer
+
+
+    def __get_db(self):
+        """Returns the database connection of the current thread."""
+
+        db = getattr(self.__local, "db", None)
+
+        if db is None:
+            db = sqlite3.connect(config.STORE_PATH, timeout=config.API_TIMEOUT)
+
+            # auto_vacuum mode must be set before the tables are created
+            db.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            db.execute("PRAGMA journal_mode = WAL")
+
+            with db:
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS feeds (
+                        key  TEXT PRIMARY KEY,
+                        time REAL NOT NULL,
+                        etag TEXT NOT NULL,
+                        data TEXT NOT NULL
+                    )""")
+
+                db.execute("""
+                    CREATE TABLE IF NOT EXISTS items (
+                        feed     TEXT NOT NULL,
+                        id       TEXT NOT NULL,
+                        position INTEGER NOT NULL,
+                        data     TEXT NOT NULL,
+                        PRIMARY KEY (feed, position)
+                    )""")
+
+            self.__local.db = db
+
+        return db
+
+
+    @staticmethod
+    def __size(db):
+        """Returns the size of data in the database."""
+
+        page_size = db.execute("PRAGMA page_size").fetchone()[0]
+        page_count = db.execute("PRAGMA page_count").fetchone()[0]
+        free_pages = db.execute("PRAGMA freelist_count").fetchone()[0]
+
+        return (page_count - free_pages) * page_size
+
+
+STORE = Store()
+"""Shared feed store."""
@@ -3,17 +3,25 @@
 # Note: Twitter HTML-escapes all the data it sends by API.
 
 import calendar
+import functools
 import json
 import logging
 import os
-import pprint
+import re
+import time
 
 from urllib.parse import urlencode
 
 import dateutil.parser
-from twitter import OAuth, Twitter
+import tornado.gen
 
+from social_rss import cache
 from social_rss import config
+from social_rss import json_decoder
+from social_rss import metrics
+from social_rss import tw_api
+from social_rss.core import LazyPformat, trace_slow_item
+from social_rss.feed import Feed, FeedItem
 from social_rss.render import block as _block
 from social_rss.render import image as _image
 from social_rss.render import image_block as _image_block
@@ -26,6 +34,18 @@ LOG = logging.getLogger(__name__)
 _TWITTER_URL = "https://twitter.com/"
 """Twitter URL."""
 
+_CREATED_AT_RE = re.compile(
+    r"(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun) (Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec) "
+    r"(\d\d) (\d\d):(\d\d):(\d\d) ([-+])(\d\d)(\d\d) (\d{4})$", re.ASCII)
+"""Matches tweet creation time in the format which Twitter API uses."""
+
+_MONTHS = { name: month for month, name in enumerate((
+    "Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"), 1) }
+"""Month numbers by their names."""
+
+_RENDERED_ITEMS = cache.MemoCache(config.RENDERED_ITEMS_CACHE_SIZE, "twitter_rendered_items")
+"""Rendered tweets."""
+
 
 class RequestHandler(BaseRequestHandler):
     """Twitter RSS request handler."""
@@ -33,35 +53,15 @@ class RequestHandler(BaseRequestHandler):
     def initialize(self, credentials=None):
         self.__credentials = credentials
 
+    @tornado.gen.coroutine
     def get(self):
         """Handles the request."""
 
         if self.__credentials is None and not self.__get_credentials():
             return
 
-        if config.OFFLINE_DEBUG_MODE or config.WRITE_OFFLINE_DEBUG:
-            debug_path = os.path.join(config.OFFLINE_DEBUG_PATH, "twitter")
-
-        if config.OFFLINE_DEBUG_MODE:
-            with open(debug_path, "rb") as debug_response:
-                timeline = json.loads(debug_response.read().decode())
-        else:
-            api = Twitter(auth=OAuth(self.__credentials["access_token_key"], self.__credentials["access_token_secret"],
-                                     self.__credentials["consumer_key"], self.__credentials["consumer_secret"]))
-
-            timeline = api.statuses.home_timeline(tweet_mode="extended", _timeout=config.API_TIMEOUT)
-
-            if config.WRITE_OFFLINE_DEBUG:
-                with open(debug_path, "wb") as debug_response:
-                    debug_response.write(json.dumps(timeline).encode())
-
-        try:
-            feed = _get_feed(timeline)
-        except Exception:
-            LOG.exception("Failed to process Twitter timeline:%s", pprint.pformat(timeline))
-            raise
-
-        self._write_rss(feed)
+        yield self._write_feed(("twitter", tuple(sorted(self.__credentials.items()))),
+            functools.partial(_get_home_timeline, self.__credentials))
 
     def __get_credentials(self):
         separator = "_"
@@ -91,91 +91,186 @@ class RequestHandler(BaseRequestHandler):
         return True
 
 
+@tornado.gen.coroutine
+def _get_home_timeline(credentials):
+    """Returns the user's home timeline feed."""
+
+    if config.OFFLINE_DEBUG_MODE or config.WRITE_OFFLINE_DEBUG:
+        debug_path = os.path.join(config.OFFLINE_DEBUG_PATH, "twitter")
+
+    if config.OFFLINE_DEBUG_MODE:
+        with open(debug_path, "rb") as debug_response:
+            timeline = json_decoder.loads(debug_response.read())
+    else:
+        timeline = yield tw_api.call(credentials, "statuses/home_timeline", tweet_mode="extended")
+
+        if config.WRITE_OFFLINE_DEBUG:
+            with open(debug_path, "wb") as debug_response:
+                debug_response.write(json.dumps(timeline).encode())
+
+    try:
+        with metrics.FEED_PROCESSING_DURATION.time("twitter"):
+            return _get_feed(timeline)
+    except Exception:
+        LOG.exception("Failed to process Twitter timeline:%s", LazyPformat(timeline))
+        raise
+
+
 def _get_feed(timeline):
     """Generates a feed from timeline."""
 
     items = []
 
     for tweet in timeline:
-        item = { "id": tweet["id_str"] }
+        if config.SLOW_ITEM_THRESHOLD is not None:
+            start_time = time.perf_counter()
 
         try:
-            item["time"] = int(calendar.timegm(dateutil.parser.parse(tweet["created_at"]).utctimetuple()))
-
-            if tweet.get("retweeted_status") is None:
-                real_tweet = tweet
-                item["title"] = tweet["user"]["name"]
-            else:
-                real_tweet = tweet["retweeted_status"]
-                item["title"] = "{} (retweeted by {})".format(
-                    real_tweet["user"]["name"], tweet["user"]["name"])
-
-            item["url"] = _twitter_user_url(real_tweet["user"]["screen_name"]) + "/status/" + real_tweet["id_str"]
-
-            item["text"] = _image_block(
-                _twitter_user_url(real_tweet["user"]["screen_name"]),
-                real_tweet["user"]["profile_image_url_https"],
-                _parse_text(real_tweet["full_text"], real_tweet["entities"]))
+            item = _RENDERED_ITEMS.get(_get_item_key(tweet), lambda: _get_item(tweet))
         except Exception:
-            LOG.exception("Failed to process the following tweet:\n%s",
-                pprint.pformat(tweet))
+            LOG.exception("Failed to process the following tweet:\n%s", LazyPformat(tweet))
 
-            item.setdefault("title", "Internal server error")
-            item.setdefault("text",  "Internal server error has occurred during processing this tweet")
+            item = FeedItem(
+                id=tweet["id_str"],
+                title="Internal server error",
+                text="Internal server error has occurred during processing this tweet")
+
+        if config.SLOW_ITEM_THRESHOLD is not None:
+            trace_slow_item(start_time, tweet)
 
         items.append(item)
 
-    return {
-        "title":       "Twitter",
-        "url":         _TWITTER_URL,
-        "image":       _TWITTER_URL + "images/resources/twitter-bird-light-bgs.png",
-        "description": "Twitter timeline",
-        "items":       items,
-    }
+    return Feed(
+        title="Twitter",
+        url=_TWITTER_URL,
+        image=_TWITTER_URL + "images/resources/twitter-bird-light-bgs.png",
+        description="Twitter timeline",
+        items=items)
 
 
-def _parse_text(text, tweet_entities):
-    """Parses a tweet text."""
+def _get_item_key(tweet):
+    """Returns a memoization key of a tweet.
 
-    sorted_entities = []
+    Besides the tweet's ID, it includes the fields which the rendered item
+    depends on, so edited tweets and renamed users are rendered again. Entities
+    are derived from the text, so they aren't included.
+    """
 
-    for entity_type, entities in tweet_entities.items():
-        for entity in entities:
-            sorted_entities.append(( entity_type, entity ))
+    real_tweet = tweet.get("retweeted_status") or tweet
+    real_user = real_tweet["user"]
+
+    return (
+        tweet["id_str"], tweet["user"]["name"], tweet["created_at"],
+        real_tweet["id_str"], real_user["name"], real_user["screen_name"], real_user["profile_image_url_https"],
+        real_tweet["full_text"])
+
+
+def _get_item(tweet):
+    """Generates a feed item from a tweet."""
 
-    sorted_entities.sort(
-        key=lambda entity_tuple: entity_tuple[1]["indices"][0], reverse=True)
+    if tweet.get("retweeted_status") is None:
+        real_tweet = tweet
+        title = tweet["user"]["name"]
+    else:
+        real_tweet = tweet["retweeted_status"]
+        title = "{} (retweeted by {})".format(
+            real_tweet["user"]["name"], tweet["user"]["name"])
 
+    return FeedItem(
+        id=tweet["id_str"],
+        title=title,
+        text=_image_block(
+            _twitter_user_url(real_tweet["user"]["screen_name"]),
+            real_tweet["user"]["profile_image_url_https"],
+            _parse_text(real_tweet["full_text"], real_tweet["entities"])),
+        url=_twitter_user_url(real_tweet["user"]["screen_name"]) + "/status/" + real_tweet["id_str"],
+        time=_parse_created_at(tweet["created_at"]))
 
-    html = ""
-    media_html = ""
-    pos = len(text)
 
-    for entity_type, entity in sorted_entities:
-        start, end = entity["indices"]
+def _parse_created_at(created_at):
+    """Parses tweet creation time into a timestamp.
 
-        if end < pos:
-            html = text[end:pos] + html
+    Twitter always returns it as "Wed Oct 10 20:19:24 +0000 2018", so it's
+    parsed by a regular expression and the generic parser is used only if the
+    time doesn't match the format.
+    """
+
+    match = _CREATED_AT_RE.match(created_at)
+
+    if match is not None:
+        month, day, hour, minute, second, sign, offset_hours, offset_minutes, year = match.groups()
+
+        month = _MONTHS[month]
+        day, hour, minute, second, year = int(day), int(hour), int(minute), int(second), int(year)
+        offset_hours, offset_minutes = int(offset_hours), int(offset_minutes)
+
+        if (
+            year >= 1000 and 1 <= day and (day <= 28 or day <= calendar.monthrange(year, month)[1]) and
+            hour < 24 and minute < 60 and second < 60 and offset_hours < 24 and offset_minutes < 60
+        ):
+            offset = offset_hours * 60 * 60 + offset_minutes * 60
+            if sign == "+":
+                offset = -offset
+
+            return calendar.timegm(( year, month, day, hour, minute, second )) + offset
+
+    return int(calendar.timegm(dateutil.parser.parse(created_at).utctimetuple()))
+
+
+def _parse_text(text, tweet_entities):
+    """Parses a tweet text."""
+
+    html = []
+    media_html = []
+    pos = 0
+
+    for start, _, end, entity_type, entity in _sorted_entities(tweet_entities):
+        if pos < start:
+            html.append(text[pos:start])
 
         if entity_type == "urls":
-            html = _link(entity["expanded_url"], entity["display_url"]) + html
+            html.append(_link(entity["expanded_url"], entity["display_url"]))
         elif entity_type == "user_mentions":
-            html = _link(_twitter_user_url(entity["screen_name"]), entity["name"]) + html
+            html.append(_link(_twitter_user_url(entity["screen_name"]), entity["name"]))
         elif entity_type == "hashtags":
-            html = _link(_TWITTER_URL + "search?" + urlencode({ "q": "#" + entity["text"] }), text[start:end]) + html
+            html.append(_link(_TWITTER_URL + "search?" + urlencode({ "q": "#" + entity["text"] }), text[start:end]))
         elif entity_type == "media":
-            html = _link(entity["expanded_url"], entity["display_url"]) + html
-            media_html += _block(_link(entity["expanded_url"], _image(entity["media_url_https"])))
+            html.append(_link(entity["expanded_url"], entity["display_url"]))
+            media_html.append(_block(_link(entity["expanded_url"], _image(entity["media_url_https"]))))
         else:
-            LOG.error("Unknown tweet entity:\n%s", pprint.pformat(entity))
-            html = text[start:end] + html
+            LOG.error("Unknown tweet entity:\n%s", LazyPformat(entity))
+            html.append(text[start:end])
+
+        pos = end
+
+    html.append(text[pos:])
+
+    # Media blocks are rendered starting from the last one
+    media_html.reverse()
+
+    return _block("".join(html)) + "".join(media_html)
+
 
-        pos = start
+def _sorted_entities(tweet_entities):
+    """Returns (start, rank, end, type, entity) tuples sorted by the entities' positions.
+
+    Entities of each type are already sorted in API responses, so sorting only
+    merges the sorted runs. Entities which start at the same position are
+    returned in reverse order.
+    """
+
+    sorted_entities = []
+    rank = 0
+
+    for entity_type, entities in tweet_entities.items():
+        for entity in entities:
+            start, end = entity["indices"]
+            rank -= 1
+            sorted_entities.append(( start, rank, end, entity_type, entity ))
 
-    if pos:
-        html = text[:pos] + html
+    sorted_entities.sort()
 
-    return _block(html) + media_html
+    return sorted_entities
 
 
 def _twitter_user_url(screen_name):
@@ -0,0 +1,141 @@
+"""Twitter API client."""
+
+import cgi
+import logging
+import time
+
+import tornado.gen
+from tornado.httpclient import AsyncHTTPClient, HTTPError
+from twitter import OAuth
+
+from social_rss import cache
+from social_rss import config
+from social_rss import json_decoder
+from social_rss import metrics
+from social_rss import rate_limit
+from social_rss.core import Error
+
+LOG = logging.getLogger(__name__)
+
+_API_URL = "https://api.twitter.com/1.1/"
+"""Twitter API URL."""
+
+_RATE_LIMIT_ERRORS = (88, 429)
+"""Rate limit exceeded API error code and HTTP status code."""
+
+
+class ApiError(Error):
+    """Twitter API error."""
+
+    retry_after = None
+    """Time after which a rate limit is reset if it's known."""
+
+    def __init__(self, code, *args, **kwargs):
+        super(ApiError, self).__init__(*args, **kwargs)
+        self.code = code
+
+
+
+@tornado.gen.coroutine
+def call(credentials, method, **kwargs):
+    """Calls the specified Twitter API method.
+
+    The request is signed with OAuth 1.0a using the specified credentials.
+    Returns a future which resolves to the method's response.
+    """
+
+    response = yield rate_limit.call(
+        lambda: _send(credentials, method, kwargs), [
+            rate_limit.get_limiter(("twitter",), config.API_HOST_RATE_LIMIT, config.API_HOST_RATE_LIMIT_BURST),
+            rate_limit.get_limiter(("twitter", cache.key(credentials["access_token_key"]), method),
+                                   config.TWITTER_RATE_LIMIT, config.TWITTER_RATE_LIMIT_BURST),
+        ], lambda e: isinstance(e, ApiError) and e.code in _RATE_LIMIT_ERRORS)
+
+    return response
+
+
+@tornado.gen.coroutine
+def _send(credentials, method, kwargs):
+    """Sends a Twitter API request.
+
+    Returns a future which resolves to the method's response.
+    """
+
+    base_url = _API_URL + method + ".json"
+
+    auth = OAuth(credentials["access_token_key"], credentials["access_token_secret"],
+                 credentials["consumer_key"], credentials["consumer_secret"])
+    url = base_url + "?" + auth.encode_params(base_url, "GET", kwargs)
+
+    LOG.debug("Sending Twitter API request: %s...", base_url)
+
+    try:
+        try:
+            with metrics.API_REQUEST_DURATION.time("twitter"):
+                http_response = yield AsyncHTTPClient().fetch(url,
+                    connect_timeout=config.API_TIMEOUT, request_timeout=config.API_TIMEOUT)
+        except HTTPError as e:
+            if e.response is None:
+                raise
+
+            error_code, error_msg = _get_error(e.response)
+            metrics.API_ERRORS.inc("twitter", error_code)
+
+            error = ApiError(error_code,
+                "Failed to process {} Twitter API request: "
+                "The server returned an error: {}", method, error_msg)
+
+            if error_code in _RATE_LIMIT_ERRORS:
+                error.retry_after = _get_retry_after(e.response)
+
+            raise error
+
+        content_type, content_type_opts = cgi.parse_header(
+            http_response.headers.get("Content-Type", ""))
+        if content_type != "application/json":
+            raise Error("The server returned a response with an invalid Content-Type ({}).", content_type)
+
+        try:
+            with metrics.API_RESPONSE_DECODING_DURATION.time("twitter"):
+                return json_decoder.loads(http_response.body, content_type_opts.get("charset", "utf-8"))
+        except Exception as e:
+            raise Error("Error while parsing the server's response: {}", e)
+    except ApiError:
+        raise
+    except Exception as e:
+        raise Error("Failed to process {} Twitter API request: {}", method, e)
+
+
+def _get_retry_after(http_response):
+    """Returns time after which the rate limit is reset or None if it's unknown.
+
+    Rate limits have 15 minutes windows, so there is no point in retrying the
+    request until its window ends.
+    """
+
+    try:
+        reset_time = http_response.headers.get("x-rate-limit-reset")
+        if reset_time is not None:
+            return max(0, int(reset_time) - time.time())
+
+        retry_after = http_response.headers.get("Retry-After")
+        if retry_after is not None:
+            return max(0, int(retry_after))
+    except ValueError:
+        pass
+
+
+def _get_error(http_response):
+    """Extracts error code and message from an API error response."""
+
+    error_code = http_response.code
+    error_msg = http_response.reason
+
+    try:
+        errors = json_decoder.loads(http_response.body)["errors"]
+        error_code = errors[0]["code"]
+        error_msg = errors[0]["message"]
+    except Exception:
+        pass
+
+    return error_code, error_msg
@@ -2,15 +2,23 @@
 
 # Note: VK HTML-escapes all the data it sends by API.
 
+import collections
 import functools
 import logging
-import pprint
 import re
+import time
 
 from urllib.parse import urlencode
 
+import tornado.gen
+
+from social_rss import cache
+from social_rss import config
+from social_rss import metrics
+from social_rss import store
 from social_rss import vk_api
-from social_rss.core import Error
+from social_rss.core import Error, LazyPformat, trace_slow_item
+from social_rss.feed import Feed, FeedItem
 from social_rss.render import block as _block
 from social_rss.render import em as _em
 from social_rss.render import image as _image
@@ -23,14 +31,23 @@ from social_rss.request import BaseRequestHandler
 LOG = logging.getLogger(__name__)
 
 
-_TEXT_URL_RE = re.compile(r"(^|\s|>)(https?://[^']+?)(\.?(?:<|\s|$))")
-"""Matches a URL in a plain text."""
+_TEXT_TOKEN_RE = re.compile(r"(?:^|(?<=[\s>]))(?:(https?://)|([a-z0-9][-a-z0-9.]*)/)|\[((?:id|club)\d+)\|")
+"""Matches a beginning of a URL, a URL without protocol specification or a user link in a post text."""
+
+_TEXT_DOMAIN_URL_START_RE = re.compile(r"(?:^|(?<=[\s>]))([a-z0-9][-a-z0-9.]*)/")
+"""Matches a beginning of a URL without protocol specification in a post text."""
+
+_TEXT_URL_START_RE = re.compile(r"(?<=[\s>])https?://")
+"""Matches a beginning of a URL which isn't at the beginning of a post text."""
+
+_TEXT_URL_END_RE = re.compile(r"'|\.?(?:<|\s|$)")
+"""Matches a character sequence which terminates a URL in a post text or a quote which can't be a part of it."""
 
-_DOMAIN_ONLY_TEXT_URL_RE = re.compile(r"(^|\s|>)((?:[a-z0-9](?:[-a-z0-9]*[a-z0-9])?\.)+[a-z0-9](?:[-a-z0-9]*[a-z0-9])/[^']+?)(\.?(?:<|\s|$))")
-"""Matches a URL without protocol specification in a plain text."""
+_USER_LINK_START_RE = re.compile(r"\[((?:id|club)\d+)\|")
+"""Matches a beginning of a user link in a post text."""
 
-_USER_LINK_RE = re.compile(r"\[((?:id|club)\d+)\|([^\]]+)\]")
-"""Matches a user link in a post text."""
+_USER_LINK_END_RE = re.compile(r"\]")
+"""Matches an end of a user link in a post text."""
 
 
 _CATEGORY_TYPE = "type/"
@@ -52,6 +69,9 @@ _CATEGORY_SOURCE_GROUP = _CATEGORY_SOURCE + "group/"
 _CATEGORY_ATTACHMENT = "attachment/"
 """Attachment."""
 
+_FAILED_ITEM_TITLE = "Внутренняя ошибка сервера"
+"""Title of items which failed to be rendered."""
+
 
 
 class RequestHandler(BaseRequestHandler):
@@ -60,6 +80,7 @@ class RequestHandler(BaseRequestHandler):
     def initialize(self, access_token=None):
         self.__access_token = access_token
 
+    @tornado.gen.coroutine
     def get(self):
         """Handles the request."""
 
@@ -71,8 +92,11 @@ class RequestHandler(BaseRequestHandler):
 
             self.__access_token = credentials[1]
 
+        show_user_avatars = self.get_argument("user_avatars", "1") != "0"
+
         try:
-            newsfeed = _get_newsfeed(self.__access_token, self.get_argument("user_avatars", "1") != "0")
+            yield self._write_feed(_get_cache_key(self.__access_token, show_user_avatars),
+                functools.partial(_get_newsfeed, self.__access_token, show_user_avatars))
         except vk_api.ApiError as e:
             if e.code == 5:
                 self._unauthorized(str(e))
@@ -80,85 +104,668 @@ class RequestHandler(BaseRequestHandler):
             else:
                 raise
 
-        self._write_rss(newsfeed)
-
 
 
 # Internal tools
 
 
+class _Newsfeed:
+    """User's news feed which is updated incrementally.
+
+    Keeps a rolling window of already rendered items and on every update
+    fetches only the items which are newer than the ones it already has. Items
+    which failed to be rendered are fetched again on next updates until they
+    are rendered or config.VK_NEWSFEED_FAILED_ITEM_RETRIES retries are made.
+
+    If an update can't fetch all new items within config.VK_NEWSFEED_MAX_PAGES
+    pages, the next update continues from the page at which it has stopped.
+
+    After restart the window is restored from the persistent store.
+    """
+
+    def __init__(self):
+        self.items = []
+        self.__newest_date = None
+        self.__failed_items = {}
+        self.__gap = None
+
+
+    @property
+    def updated(self):
+        """Whether the news feed has been filled with items."""
+
+        return self.__newest_date is not None
+
+
+    def restore(self, items):
+        """Restores the window from items of a stored feed.
+
+        Items which failed to be rendered are fetched again on next updates.
+        """
+
+        if not self.updated:
+            self.__merge(items, { item for item in items if item.title == _FAILED_ITEM_TITLE })
+
+
+    @tornado.gen.coroutine
+    def update(self, access_token, show_user_avatars):
+        """Fetches new items of the news feed."""
+
+        kwargs = { "max_photos": 10 }
+        if self.__gap is not None:
+            kwargs["start_time"], kwargs["start_from"] = self.__gap
+        elif self.__newest_date is not None:
+            kwargs["start_time"] = self.__newest_date
+
+            if self.__failed_items:
+                kwargs["start_time"] = min(item.time for item in self.__failed_items)
+
+        items = []
+        failed_items = set()
+        gap = None
+
+        for page in range(config.VK_NEWSFEED_MAX_PAGES):
+            response = yield vk_api.call(access_token, "newsfeed.get", **kwargs)
+            users = yield _get_response_users(access_token, response)
+
+            with metrics.FEED_PROCESSING_DURATION.time("vk"):
+                items.extend(_get_items(response, users, show_user_avatars, failed_items))
+
+            # On the first update we fetch only the first page as we used to.
+            # On next updates we follow the pages to fill the gap between the
+            # updates.
+            if self.__newest_date is None or not response.get("next_from"):
+                break
+
+            kwargs["start_from"] = response["next_from"]
+        else:
+            LOG.warning("Unable to fetch all new news feed items: page limit exceeded. "
+                        "The rest of them will be fetched on the next update.")
+            gap = ( kwargs["start_time"], kwargs["start_from"] )
+
+        self.__merge(items, failed_items)
+        self.__gap = gap
+
+
+    def __merge(self, new_items, failed_items):
+        """Merges new items into the window."""
+
+        items = []
+        ids = set()
+
+        # Pages may overlap, so the newest version of an item is the first one
+        for item in new_items + self.items:
+            if item.id not in ids:
+                ids.add(item.id)
+                items.append(item)
+
+        items.sort(key=lambda item: item.time, reverse=True)
+        del items[config.VK_NEWSFEED_WINDOW:]
+
+        self.items = items
+
+        # Failed items which have been fetched again are replaced by their new
+        # versions, and the ones which have left the window are forgotten.
+        previous_failed_items = self.__failed_items
+        retries = { item.id: item_retries for item, item_retries in previous_failed_items.items() }
+        self.__failed_items = {}
+
+        for item in items:
+            if item in failed_items:
+                if item.id not in retries:
+                    self.__failed_items[item] = 0
+                elif retries[item.id] < config.VK_NEWSFEED_FAILED_ITEM_RETRIES:
+                    self.__failed_items[item] = retries[item.id] + 1
+                else:
+                    LOG.warning("Giving up on rendering of %s news feed item.", item.id)
+            elif item in previous_failed_items:
+                self.__failed_items[item] = previous_failed_items[item]
+
+        if items and (self.__newest_date is None or items[0].time > self.__newest_date):
+            self.__newest_date = items[0].time
+
+
+class _Finder:
+    """Finds matches of a regular expression in a text.
+
+    Remembers the last found match, so a series of searches from nondecreasing
+    positions scans the text only once.
+    """
+
+    __slots__ = ("__text", "__regex", "__pos", "__match")
+
+    def __init__(self, text, regex):
+        self.__text = text
+        self.__regex = regex
+        self.__pos = None
+        self.__match = None
+
+    def find(self, pos):
+        """Returns the first match at or after the specified position or None."""
+
+        if (
+            self.__pos is None or pos < self.__pos or
+            self.__match is not None and pos > self.__match.start()
+        ):
+            self.__pos = pos
+            self.__match = self.__regex.search(self.__text, pos)
+
+        return self.__match
+
+
+class _TextParser:
+    """Post text parser.
+
+    Replaces URLs, URLs without protocol specification and user links with HTML
+    links. The result is the same as if they were replaced by regular
+    expressions one after another, but the text is scanned in a single pass and
+    in linear time even for pathological texts.
+    """
+
+    def __init__(self, text):
+        self.__text = text
+        self.__url_ends = {}
+        self.__next_url = ( None, None )
+
+        self.__url_end_finder = _Finder(text, _TEXT_URL_END_RE)
+        self.__domain_url_end_finder = _Finder(text, _TEXT_URL_END_RE)
+        self.__next_url_end_finder = _Finder(text, _TEXT_URL_END_RE)
+        self.__url_start_finder = _Finder(text, _TEXT_URL_START_RE)
+        self.__user_link_end_finder = _Finder(text, _USER_LINK_END_RE)
+
+
+    def parse(self):
+        """Returns the parsed text."""
+
+        text = self.__text
+        links = []
+        user_links = []
+
+        # Positions till which the text has been consumed by URLs, URLs
+        # without protocol specification and user links
+        url_pos = domain_url_pos = user_link_pos = 0
+
+        # Whether some user link overlaps with some URL
+        overlap = False
+
+        pos = 0
+        while True:
+            match = _TEXT_TOKEN_RE.search(text, pos)
+            if match is None:
+                break
+
+            start = match.start()
+            scheme, domain, user_id = match.groups()
+            pos = match.end()
+
+            if user_id is not None:
+                if start >= user_link_pos:
+                    user_link = self.__user_link(start, user_id, pos)
+                    if user_link is not None:
+                        user_links.append(user_link)
+                        user_link_pos = user_link[1]
+
+                continue
+
+            if scheme is not None:
+                if start and start <= url_pos:
+                    continue
+
+                url_end = self.__url_end(pos, self.__url_end_finder)
+                if url_end is None:
+                    continue
+
+                end, url_pos = url_end
+                url = text[start:end]
+                html = _link(url, url)
+
+                if _TEXT_DOMAIN_URL_START_RE.search(url) is not None:
+                    # URLs without protocol specification are replaced after
+                    # URLs, so they may be found in the rendered link and may
+                    # even consume the URL's terminator.
+                    html += text[end:url_pos]
+                    end = url_pos
+
+                    parser = _TextParser(html)
+                    html, consumed = parser.__parse_domain_urls()
+                    if consumed == len(parser.__text):
+                        domain_url_pos = end
+
+                links.append(( start, end, html ))
+            else:
+                if start and start <= domain_url_pos:
+                    continue
+
+                url_end = self.__domain_url_end(domain, pos)
+                if url_end is None:
+                    continue
+
+                end, domain_url_pos = url_end
+                url = text[start:end]
+                links.append(( start, end, _link("http://" + url, url) ))
+
+            overlap = overlap or start < user_link_pos or "[" in url or "]" in url
+            pos = end
+
+        if overlap:
+            # User links must be searched in the text with replaced URLs
+            return _TextParser(self.__join(links)).__parse_user_links()
+
+        return self.__join(sorted(links + user_links))
+
+
+    def __parse_domain_urls(self):
+        """
+        Replaces only URLs without protocol specification in the text.
+
+        Returns the resulting text and the position till which the source text
+        has been consumed.
+        """
+
+        text = self.__text
+        links = []
+        domain_url_pos = 0
+
+        pos = 0
+        while True:
+            match = _TEXT_DOMAIN_URL_START_RE.search(text, pos)
+            if match is None:
+                break
+
+            start = match.start()
+            pos = match.end()
+
+            if start and start <= domain_url_pos:
+                continue
+
+            url_end = self.__domain_url_end(match.group(1), pos, with_urls=False)
+            if url_end is None:
+                continue
+
+            end, domain_url_pos = url_end
+            url = text[start:end]
+            links.append(( start, end, _link("http://" + url, url) ))
+            pos = end
+
+        return self.__join(links), domain_url_pos
+
+
+    def __parse_user_links(self):
+        """Returns the text with replaced user links."""
+
+        text = self.__text
+        user_links = []
+
+        pos = 0
+        while True:
+            match = _USER_LINK_START_RE.search(text, pos)
+            if match is None:
+                break
+
+            pos = match.end()
+
+            user_link = self.__user_link(match.start(), match.group(1), pos)
+            if user_link is not None:
+                user_links.append(user_link)
+                pos = user_link[1]
+
+        return self.__join(user_links)
+
+
+    def __url_end(self, pos, end_finder):
+        """
+        Returns (end, consumed text end) of a URL which path starts at the
+        specified position or None if there is no valid URL.
+        """
+
+        try:
+            return self.__url_ends[pos]
+        except KeyError:
+            pass
+
+        text = self.__text
+        url_end = None
+
+        if pos < len(text) and text[pos] != "'":
+            end = end_finder.find(pos + 1)
+            if end.group() != "'":
+                url_end = end.start(), end.end()
+
+        self.__url_ends[pos] = url_end
+
+        return url_end
+
+
+    def __domain_url_end(self, domain, pos, with_urls=True):
+        """
+        Returns (end, consumed text end) of a URL without protocol
+        specification which path starts at the specified position or None if
+        there is no valid URL.
+
+        with_urls specifies whether URLs with protocol specification are
+        replaced in the text.
+        """
+
+        text = self.__text
+        labels = domain.split(".")
+
+        if (
+            len(labels) < 2 or len(labels[-1]) < 2 or
+            any(not label or label[0] == "-" or label[-1] == "-" for label in labels) or
+            pos >= len(text) or text[pos] == "'"
+        ):
+            return
+
+        end = self.__domain_url_end_finder.find(pos + 1)
+        quote = end.group() == "'"
+        end, consumed_end = end.start(), end.end()
+
+        # URLs are replaced first, so the path can't contain them. Inside of
+        # the path a URL may start only after its first character if it's a
+        # whitespace or after ">".
+        if with_urls and (text[pos].isspace() or text.find(">", pos, end) != -1):
+            url_start = self.__next_url_start(pos + 1)
+            if url_start is not None and url_start < end:
+                return url_start, url_start
+
+        if quote:
+            return
+
+        return end, consumed_end
+
+
+    def __next_url_start(self, pos):
+        """Returns a start of the first URL at or after the specified position or None."""
+
+        cached_pos, start = self.__next_url
+        if cached_pos is not None and cached_pos <= pos and (start is None or pos <= start):
+            return start
+
+        search_pos = pos
+
+        while True:
+            match = self.__url_start_finder.find(search_pos)
+            if match is None:
+                start = None
+                break
+
+            if self.__url_end(match.end(), self.__next_url_end_finder) is not None:
+                start = match.start()
+                break
+
+            search_pos = match.end()
+
+        self.__next_url = ( pos, start )
+
+        return start
+
+
+    def __user_link(self, start, user_id, pos):
+        """
+        Returns (start, end, HTML) of a user link which name starts at the
+        specified position or None if there is no valid user link.
+        """
+
+        end = self.__user_link_end_finder.find(pos)
+        if end is None or end.start() == pos:
+            return
+
+        end = end.start()
+
+        return start, end + 1, _em(_vk_link(user_id, self.__text[pos:end]))
+
+
+    def __join(self, replacements):
+        """Returns the text with the specified sorted (start, end, HTML) replacements."""
+
+        text = self.__text
+        fragments = []
+
+        pos = 0
+        for start, end, html in replacements:
+            fragments.append(text[pos:start])
+            fragments.append(html)
+            pos = end
+
+        fragments.append(text[pos:])
+
+        return "".join(fragments)
+
+
+
+_NEWSFEEDS = collections.OrderedDict()
+"""Incrementally updated news feeds of recently served users."""
+
+_RENDERED_ITEMS = cache.MemoCache(config.RENDERED_ITEMS_CACHE_SIZE, "vk_rendered_items")
+"""Rendered news feed items."""
+
+_USERS = cache.ExpiringCache(config.VK_USERS_CACHE_SIZE, config.VK_USERS_CACHE_TTL)
+"""Profiles and groups shared between all users."""
+
+
+@tornado.gen.coroutine
 def _get_newsfeed(access_token, show_user_avatars):
     """Returns VK news feed."""
 
-    response = vk_api.call(access_token, "newsfeed.get", max_photos=10)
+    if _incremental_updates():
+        key = cache.key(*_get_cache_key(access_token, show_user_avatars))
+        newsfeed = _get_user_newsfeed(key)
+
+        if not newsfeed.updated and config.STORE_PATH is not None:
+            stored = yield store.STORE.load(key)
+            if stored is not None:
+                newsfeed.restore(stored[1].items)
+
+        yield newsfeed.update(access_token, show_user_avatars)
+        items = newsfeed.items
+    else:
+        response = yield vk_api.call(access_token, "newsfeed.get", max_photos=10)
+        users = yield _get_response_users(access_token, response)
+
+        with metrics.FEED_PROCESSING_DURATION.time("vk"):
+            items = _get_items(response, users, show_user_avatars)
+
+    return Feed(
+        title="ВКонтакте: Новости",
+        url=_vk_url(),
+        image=_vk_url("press/Simple.png"),
+        description="Новостная лента ВКонтакте",
+        items=items)
+
+
+def _get_cache_key(access_token, show_user_avatars):
+    """Returns cache key of the user's news feed."""
+
+    cache_key = ( "vk", access_token, show_user_avatars )
+
+    if _incremental_updates():
+        # Incrementally updated news feeds are kept by each worker, so workers
+        # mustn't take such feeds from each other via the cache.
+        cache_key += ( config.WORKER_ID, )
+
+    return cache_key
+
+
+def _incremental_updates():
+    """Returns True if news feeds are updated incrementally."""
+
+    return config.VK_NEWSFEED_WINDOW > 0 and not config.OFFLINE_DEBUG_MODE
+
+
+def _get_user_newsfeed(key):
+    """Returns incrementally updated news feed with the specified key."""
+
+    try:
+        newsfeed = _NEWSFEEDS.pop(key)
+    except KeyError:
+        newsfeed = _Newsfeed()
+
+        while len(_NEWSFEEDS) >= config.VK_NEWSFEED_MAX_USERS:
+            _NEWSFEEDS.popitem(last=False)
+
+    _NEWSFEEDS[key] = newsfeed
+
+    return newsfeed
+
+
+def _get_items(response, users, show_user_avatars, failed_items=None):
+    """Generates feed items from a newsfeed.get response.
+
+    Items which failed to be rendered are added to failed_items set if it's
+    specified.
+    """
 
     try:
         items = []
-        users = _get_users(response["profiles"], response["groups"])
 
-        LOG.debug("Newsfeed: %s", pprint.pformat(response["items"]))
+        LOG.debug("Newsfeed: %s", LazyPformat(response["items"]))
 
         for api_item in response["items"]:
-            try:
-                user = users[api_item["source_id"]]
-
-                if api_item["type"] == "post":
-                    item = _post_item(users, user, api_item)
-                elif api_item["type"] in ("photo", "photo_tag"):
-                    item = _photo_item(users, user, api_item)
-                elif api_item["type"] in ("audio", "video"):
-                    continue # Don't generate items for every song or movie added by someone
-                elif api_item["type"] == "wall_photo":
-                    continue # It duplicates post items with any photo
-                elif api_item["type"] == "friend":
-                    item = _friend_item(users, user, api_item)
-                elif api_item["type"] == "note":
-                    item = _note_item(users, user, api_item)
-                else:
-                    raise Error("Unknown news item type.")
+            item_id = "{}/{}/{}".format(
+                _get_profile_name(api_item["source_id"]), api_item["type"], api_item["date"])
 
-                # This item should be skipped
-                if item is None:
-                    continue
+            if config.SLOW_ITEM_THRESHOLD is not None:
+                start_time = time.perf_counter()
 
-                item["author"] = user["name"]
+            try:
+                item = _RENDERED_ITEMS.get((item_id, api_item.get("edited"), show_user_avatars),
+                    lambda: _get_item(users, api_item, item_id, show_user_avatars))
+            except Exception:
+                LOG.exception("Failed to process news feed item:\n%s", LazyPformat(api_item))
 
-                if show_user_avatars:
-                    item["text"] = _image_block(_get_user_url(user["id"]), user["photo"], item["text"])
+                item = FeedItem(
+                    id=item_id,
+                    title=_FAILED_ITEM_TITLE,
+                    text="При обработке новости произошла внутренняя ошибка сервера",
+                    time=api_item["date"])
 
-                item["categories"] = sorted(item.get("categories", set()) | {
-                    _CATEGORY_TYPE + api_item["type"],
-                    (_CATEGORY_SOURCE_GROUP if user["id"] < 0 else _CATEGORY_SOURCE_USER) + _get_profile_name(user["id"]),
-                })
-            except Exception:
-                LOG.exception("Failed to process news feed item:\n%s",
-                    pprint.pformat(api_item))
+                if failed_items is not None:
+                    failed_items.add(item)
 
-                item = {
-                    "title": "Внутренняя ошибка сервера",
-                    "text":  "При обработке новости произошла внутренняя ошибка сервера",
-                }
+            if config.SLOW_ITEM_THRESHOLD is not None:
+                trace_slow_item(start_time, api_item)
 
-            item["id"] = "{}/{}/{}".format(
-                _get_profile_name(api_item["source_id"]), api_item["type"], api_item["date"])
-            item["time"] = api_item["date"]
+            # This item should be skipped
+            if item is None:
+                continue
 
             items.append(item)
     except Exception:
-        LOG.exception("Failed to process news feed:\n%s", pprint.pformat(response))
+        LOG.exception("Failed to process news feed:\n%s", LazyPformat(response))
         raise
 
-    return {
-        "title":       "ВКонтакте: Новости",
-        "url":         _vk_url(),
-        "image":       _vk_url("press/Simple.png"),
-        "description": "Новостная лента ВКонтакте",
-        "items":       items,
-    }
+    return items
+
+
+def _get_item(users, api_item, item_id, show_user_avatars):
+    """Generates a feed item from a news feed item.
+
+    Returns None if the item should be skipped.
+    """
+
+    user = users[api_item["source_id"]]
+
+    if api_item["type"] == "post":
+        item = _post_item(users, user, api_item)
+    elif api_item["type"] in ("photo", "photo_tag"):
+        item = _photo_item(users, user, api_item)
+    elif api_item["type"] in ("audio", "video"):
+        return # Don't generate items for every song or movie added by someone
+    elif api_item["type"] == "wall_photo":
+        return # It duplicates post items with any photo
+    elif api_item["type"] == "friend":
+        item = _friend_item(users, user, api_item)
+    elif api_item["type"] == "note":
+        item = _note_item(users, user, api_item)
+    else:
+        raise Error("Unknown news item type.")
+
+    # This item should be skipped
+    if item is None:
+        return
+
+    text = item["text"]
+    if show_user_avatars:
+        text = _image_block(_get_user_url(user["id"]), user["photo"], text)
+
+    return FeedItem(
+        id=item_id,
+        title=item["title"],
+        text=text,
+        url=item.get("url"),
+        author=user["name"],
+        time=api_item["date"],
+        categories=sorted(item.get("categories", set()) | {
+            _CATEGORY_TYPE + api_item["type"],
+            (_CATEGORY_SOURCE_GROUP if user["id"] < 0 else _CATEGORY_SOURCE_USER) + _get_profile_name(user["id"]),
+        }))
+
+
+@tornado.gen.coroutine
+def _get_response_users(access_token, response):
+    """Returns users referenced by a newsfeed.get response.
+
+    The users which are missing in the response are taken from the shared
+    users cache or requested from the API.
+    """
+
+    users = _get_users(response["profiles"], response["groups"])
+    missing_ids = set()
+
+    for api_item in response["items"]:
+        user_ids = [ api_item.get("source_id"), api_item.get("copy_owner_id") ]
+        if "friends" in api_item:
+            user_ids.extend(friend["uid"] for friend in api_item["friends"]["items"])
+
+        for user_id in user_ids:
+            if user_id is None or user_id in users:
+                continue
+
+            user = _USERS.get(user_id)
+            if user is None:
+                missing_ids.add(user_id)
+            else:
+                users[user_id] = user
+
+    if missing_ids:
+        try:
+            users.update((yield _fetch_users(access_token, missing_ids)))
+        except Exception as e:
+            LOG.warning("Failed to fetch users missing in the news feed: %s", e)
+
+    return users
+
+
+@tornado.gen.coroutine
+def _fetch_users(access_token, user_ids):
+    """Fetches the specified users and groups in a single API request."""
+
+    profile_ids = sorted(user_id for user_id in user_ids if user_id > 0)
+    group_ids = sorted(-user_id for user_id in user_ids if user_id < 0)
+
+    batch = vk_api.Batch(access_token)
+    calls = {}
+
+    if profile_ids:
+        calls["profiles"] = batch.call("users.get", user_ids=",".join(map(str, profile_ids)), fields="photo")
+
+    if group_ids:
+        calls["groups"] = batch.call("groups.getById", group_ids=",".join(map(str, group_ids)))
+
+    yield batch.execute()
+
+    # If the execute request fails, all the calls fail with the same error, so
+    # all of them must be retrieved to not log it as never retrieved.
+    results = yield tornado.gen.multi(calls, quiet_exceptions=Exception)
+
+    return _get_users(results.get("profiles", []), results.get("groups", []))
 
 
 def _get_users(profiles, groups):
-    """Maps profiles and groups to their IDs."""
+    """Maps profiles and groups to their IDs.
+
+    Also saves them to the shared users cache.
+    """
 
     users = {}
 
@@ -176,6 +783,9 @@ def _get_users(profiles, groups):
             "photo": group["photo_50"],
         }
 
+    for user in users.values():
+        _USERS.set(user["id"], user)
+
     return users
 
 
@@ -298,11 +908,7 @@ def _note_item(users, user, item):
 def _parse_text(html):
     """Parses a post text."""
 
-    html = _TEXT_URL_RE.sub(r"\1" + _link(r"\2", r"\2") + r"\3", html)
-    html = _DOMAIN_ONLY_TEXT_URL_RE.sub(r"\1" + _link(r"http://\2", r"\2") + r"\3", html)
-    html = _USER_LINK_RE.sub(_em(_link(_vk_url(r"\1"), r"\2")), html)
-
-    return html.strip()
+    return _TextParser(html).parse().strip()
 
 
 def _photo_item(users, user, api_item):
@@ -494,7 +1100,7 @@ def _post_item(users, user, item):
 
     if unknown_attachments:
         LOG.error("Got a post with unknown attachment type (%s):\n%s",
-            ", ".join(unknown_attachments), pprint.pformat(item))
+            ", ".join(unknown_attachments), LazyPformat(item))
 
 
     html = top_html + main_html + bottom_html
@@ -4,10 +4,17 @@ import cgi
 import json
 import logging
 import os
-import urllib.request
 from urllib.parse import urlencode
 
+import tornado.concurrent
+import tornado.gen
+
+from social_rss import cache
 from social_rss import config
+from social_rss import http_client
+from social_rss import json_decoder
+from social_rss import metrics
+from social_rss import rate_limit
 from social_rss.core import Error
 
 LOG = logging.getLogger(__name__)
@@ -15,6 +22,9 @@ LOG = logging.getLogger(__name__)
 _VK_API_URL = "https://api.vk.com/"
 """VK API URL."""
 
+_TOO_MANY_REQUESTS_ERROR = 6
+"""Too many requests per second API error code."""
+
 
 class ApiError(Error):
     """VK API error."""
@@ -25,8 +35,139 @@ class ApiError(Error):
 
 
 
+class Batch:
+    """A batch of VK API calls.
+
+    The calls are sent as execute method requests, up to _MAX_EXECUTE_CALLS
+    calls per request:
+
+        batch = Batch(access_token)
+        users = batch.call("users.get", user_ids="1,2")
+        groups = batch.call("groups.getById", group_ids="1")
+        yield batch.execute()
+        users = users.result()
+
+    A failed call's future raises ApiError as if the method was called
+    directly. Calls which failed due to the rate limit are resent the same way
+    as standalone calls.
+    """
+
+    _MAX_EXECUTE_CALLS = 25
+    """Maximum number of API calls an execute request may contain."""
+
+    def __init__(self, access_token):
+        self.__access_token = access_token
+        self.__calls = []
+
+    def __len__(self):
+        return len(self.__calls)
+
+    def call(self, method, **kwargs):
+        """Adds a call of the specified VK API method to the batch.
+
+        Returns a future which resolves to the method's response after the
+        batch is executed.
+        """
+
+        future = tornado.concurrent.Future()
+        self.__calls.append(( method, kwargs, future ))
+        return future
+
+    @tornado.gen.coroutine
+    def execute(self):
+        """Executes all queued calls."""
+
+        calls, self.__calls = self.__calls, []
+
+        yield [
+            self.__execute(calls[pos:pos + self._MAX_EXECUTE_CALLS])
+            for pos in range(0, len(calls), self._MAX_EXECUTE_CALLS) ]
+
+    @tornado.gen.coroutine
+    def __execute(self, calls):
+        """Sends an execute request with the specified calls."""
+
+        pending = calls
+
+        @tornado.gen.coroutine
+        def send():
+            nonlocal pending
+
+            code = "return [" + ",".join(
+                "API.{}({})".format(method, json.dumps(kwargs, ensure_ascii=False))
+                for method, kwargs, future in pending) + "];"
+
+            response = yield _send(self.__access_token, "execute", { "code": code })
+            results = response["response"]
+            errors = iter(response.get("execute_errors", []))
+
+            if not isinstance(results, list) or len(results) != len(pending):
+                raise Error("Failed to process execute VK API request: Got an invalid response.")
+
+            rate_limited = []
+
+            for (method, kwargs, future), result in zip(pending, results):
+                # Failed calls return false and their errors are listed in execute_errors
+                if result is False:
+                    error = _api_error(method, next(errors, {}))
+                    if _is_rate_limit_error(error):
+                        rate_limited.append(( method, kwargs, future ))
+                        rate_limit_error = error
+                    else:
+                        future.set_exception(error)
+                else:
+                    future.set_result(result)
+
+            pending = rate_limited
+            if pending:
+                raise rate_limit_error
+
+        try:
+            yield _rate_limited(self.__access_token, send)
+        except Exception as e:
+            for method, kwargs, future in pending:
+                future.set_exception(e)
+
+
+
+@tornado.gen.coroutine
 def call(access_token, method, **kwargs):
-    """Calls the specified VK API method."""
+    """Calls the specified VK API method.
+
+    Returns a future which resolves to the method's response.
+    """
+
+    response = yield _rate_limited(access_token, lambda: _send(access_token, method, kwargs.copy()))
+    return response["response"]
+
+
+def _rate_limited(access_token, request):
+    """Sends a request with rate limiting and retries on rate limit errors.
+
+    Returns a future which resolves to the request's result.
+    """
+
+    if config.OFFLINE_DEBUG_MODE:
+        return request()
+
+    return rate_limit.call(request, [
+        rate_limit.get_limiter(("vk",), config.API_HOST_RATE_LIMIT, config.API_HOST_RATE_LIMIT_BURST),
+        rate_limit.get_limiter(("vk", cache.key(access_token)), config.VK_RATE_LIMIT, config.VK_RATE_LIMIT_BURST),
+    ], _is_rate_limit_error)
+
+
+def _is_rate_limit_error(error):
+    """Checks whether the error is caused by the rate limit."""
+
+    return isinstance(error, ApiError) and error.code == _TOO_MANY_REQUESTS_ERROR
+
+
+@tornado.gen.coroutine
+def _send(access_token, method, kwargs):
+    """Sends a VK API request.
+
+    Returns a future which resolves to the whole API response.
+    """
 
     kwargs.setdefault("access_token", access_token)
     kwargs.setdefault("language", "0")
@@ -42,42 +183,54 @@ def call(access_token, method, **kwargs):
     try:
         if config.OFFLINE_DEBUG_MODE:
             with open(debug_path, "rb") as debug_response:
-                response = json.loads(debug_response.read().decode())
+                response = json_decoder.loads(debug_response.read())
         else:
-            request = urllib.request.Request(url, headers={ "Accept-Language": "ru,en" })
+            with metrics.API_REQUEST_DURATION.time("vk"):
+                http_response = yield http_client.POOL.fetch(url,
+                    headers={ "Accept-Language": "ru,en" }, timeout=config.API_TIMEOUT)
+
+            if http_response.code != 200:
+                raise Error("The server returned an error: {} {}.", http_response.code, http_response.reason)
 
-            with urllib.request.urlopen(request, timeout=config.API_TIMEOUT) as http_response:
-                content_type = http_response.getheader("content-type")
-                if content_type is None:
-                    raise Error("The server returned a response without Content-Type header.")
+            content_type = http_response.headers.get("Content-Type")
+            if content_type is None:
+                raise Error("The server returned a response without Content-Type header.")
 
-                content_type, content_type_opts = cgi.parse_header(content_type)
-                if content_type != "application/json":
-                    raise Error("The server returned a response with an invalid Content-Type ({}).", content_type)
+            content_type, content_type_opts = cgi.parse_header(content_type)
+            if content_type != "application/json":
+                raise Error("The server returned a response with an invalid Content-Type ({}).", content_type)
 
-                response = http_response.read()
+            response = http_response.body
 
-                if config.WRITE_OFFLINE_DEBUG:
-                    with open(debug_path, "wb") as debug_response:
-                        debug_response.write(response)
+            if config.WRITE_OFFLINE_DEBUG:
+                with open(debug_path, "wb") as debug_response:
+                    debug_response.write(response)
 
-                try:
-                    response = json.loads(response.decode(content_type_opts.get("charset", "utf-8")))
-                except Exception as e:
-                    raise Error("Error while parsing the server's response: {}", e)
+            try:
+                with metrics.API_RESPONSE_DECODING_DURATION.time("vk"):
+                    response = json_decoder.loads(response, content_type_opts.get("charset", "utf-8"))
+            except Exception as e:
+                raise Error("Error while parsing the server's response: {}", e)
     except Exception as e:
         raise Error("Failed to process {} VK API request: {}", method, e)
 
     if "error" in response or "response" not in response:
-        error = response.get("error", {})
-        error_msg = error.get("error_msg", "").strip()
-        error_code = error.get("error_code", 1)
+        raise _api_error(method, response.get("error", {}))
 
-        if not error_msg:
-            error_msg = "Unknown error"
+    return response
 
-        raise ApiError(error_code,
-            "Failed to process {} VK API request: "
-            "The server returned an error: {}", method, error_msg)
 
-    return response["response"]
+def _api_error(method, error):
+    """Returns an exception for the specified API error."""
+
+    error_msg = error.get("error_msg", "").strip()
+    error_code = error.get("error_code", 1)
+
+    if not error_msg:
+        error_msg = "Unknown error"
+
+    metrics.API_ERRORS.inc("vk", error_code)
+
+    return ApiError(error_code,
+        "Failed to process {} VK API request: "
+        "The server returned an error: {}", method, error_msg)
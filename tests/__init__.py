@@ -0,0 +1 @@
+"""Social RSS tests."""
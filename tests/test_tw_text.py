@@ -0,0 +1,35 @@
+"""Tests tweet text rendering."""
+
+import logging
+import unittest
+
+from benchmarks import tw_text
+from social_rss import tw
+
+
+class TestParseText(unittest.TestCase):
+    """Tests the forward-pass renderer against the prepending one it has replaced."""
+
+    _ENTITY_COUNTS = (0, 1, 2, 3, 10, 100)
+    """Numbers of entities in the synthetic tweets."""
+
+    def setUp(self):
+        # Suppress errors about unknown entities
+        logging.disable(logging.ERROR)
+        self.addCleanup(logging.disable, logging.NOTSET)
+
+    def test_corpus(self):
+        for name, text, entities in tw_text.CORPUS:
+            with self.subTest(tweet=name):
+                self.assertEqual(tw._parse_text(text, entities), tw_text.parse_text_by_prepending(text, entities))
+
+    def test_synthetic_tweets(self):
+        for count in self._ENTITY_COUNTS:
+            text, entities = tw_text.get_tweet(count)
+
+            with self.subTest(entities=count):
+                self.assertEqual(tw._parse_text(text, entities), tw_text.parse_text_by_prepending(text, entities))
+
+
+if __name__ == "__main__":
+    unittest.main()
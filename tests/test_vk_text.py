@@ -0,0 +1,36 @@
+"""Tests VK post text parsing."""
+
+import unittest
+
+from benchmarks import vk_text
+from social_rss import vk
+
+
+class TestParseText(unittest.TestCase):
+    """Tests the single-pass parser against the regular expressions it has replaced."""
+
+    _TEXT_SIZES = (1, 2, 10, 100)
+    """Numbers of repetitions of the text patterns."""
+
+    def test_corpus(self):
+        for name, pattern in vk_text.TEXTS.items():
+            for size in self._TEXT_SIZES:
+                for suffix in ("", "'"):
+                    text = pattern * size + suffix
+
+                    with self.subTest(text=name, size=size, suffix=suffix):
+                        self.assertEqual(vk._parse_text(text), vk_text.parse_text_by_regexes(text))
+
+    def test_mixed_patterns(self):
+        patterns = list(vk_text.TEXTS.values())
+
+        for first in patterns:
+            for second in patterns:
+                text = first + second
+
+                with self.subTest(text=text):
+                    self.assertEqual(vk._parse_text(text), vk_text.parse_text_by_regexes(text))
+
+
+if __name__ == "__main__":
+    unittest.main()